@@ -39,9 +39,9 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'rest_framework.authtoken',
-    'core',
-    'user',
-    'recipe',
+    'core.apps.CoreConfig',
+    'user.apps.UserConfig',
+    'recipe.apps.RecipeConfig',
 ]
 
 MIDDLEWARE = [
@@ -133,9 +133,94 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/3.1/howto/static-files/
 
 STATIC_URL = '/static/'
-MEDIA_UEL = '/media/'
+MEDIA_URL = '/media/'
 
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
 AUTH_USER_MODEL = 'core.User'
+
+# The tokens of recently seen users are kept in memory by every worker
+# for TOKEN_CACHE_TTL seconds, so a revoked token that was not deleted
+# through the ORM stops working after at most that long
+TOKEN_CACHE_TTL = 60
+TOKEN_CACHE_MAX_SIZE = 10000
+
+# The cache is in memory of every process by default. With more than one
+# worker process it has to be shared, for example
+# CACHE_BACKEND=django.core.cache.backends.memcached.PyLibMCCache and
+# CACHE_LOCATION=memcached:11211, or
+# CACHE_BACKEND=django.core.cache.backends.db.DatabaseCache and
+# CACHE_LOCATION=cache_table (after manage.py createcachetable)
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+        'KEY_PREFIX': os.environ.get('CACHE_KEY_PREFIX', 'app'),
+    }
+}
+
+# The cache holding the versions behind the ETags of the recipe API, it
+# must be shared by every worker process (see recipe/checks.py)
+API_VERSION_CACHE = 'default'
+# Seconds a version is kept, a version that expired only costs its
+# clients one full response
+API_VERSION_TIMEOUT = 24 * 60 * 60
+# Set when a single process serves the API (like runserver), so the caches
+# above may be in its memory
+API_CACHE_SINGLE_PROCESS = os.environ.get(
+    'API_CACHE_SINGLE_PROCESS', '1' if DEBUG else '0'
+) == '1'
+# The cache of the serialized tag and ingredient lists and of the rendered
+# recipe details, and for how many seconds an entry is kept (old entries
+# are never read again anyway). It must be shared like the versions
+API_RESPONSE_CACHE = 'default'
+API_RESPONSE_CACHE_TIMEOUT = 60 * 60
+
+# Let the database build the JSON of the recipe list and detail (with
+# json_build_object / json_agg on PostgreSQL), for users with many recipes
+RECIPE_SQL_JSON = os.environ.get('RECIPE_SQL_JSON', '0') == '1'
+
+# Recipes read per database round trip by /api/recipe/recipes/export/
+RECIPE_EXPORT_CHUNK_SIZE = 2000
+
+# Lifetime in seconds of the signed tokens from /api/user/token/access/
+ACCESS_TOKEN_LIFETIME = 5 * 60
+REFRESH_TOKEN_LIFETIME = 14 * 24 * 60 * 60
+
+# Threads per worker process that create the renditions of uploaded
+# images, 0 creates them in the request after the upload is saved
+IMAGE_PROCESSING_WORKERS = 2
+
+# Largest image accepted by the chunked uploads, and how long in seconds
+# an upload session is kept without receiving a chunk
+IMAGE_UPLOAD_MAX_SIZE = 20 * 1024 * 1024
+IMAGE_UPLOAD_SESSION_TTL = 24 * 60 * 60
+
+# The image formats accepted by the uploads with the largest file of each,
+# checked from the first bytes received along with the dimensions
+IMAGE_UPLOAD_FORMATS = {
+    'JPEG': 15 * 1024 * 1024,
+    'PNG': 20 * 1024 * 1024,
+    'WEBP': 10 * 1024 * 1024,
+    'GIF': 5 * 1024 * 1024,
+}
+IMAGE_UPLOAD_MAX_DIMENSION = 10000
+IMAGE_UPLOAD_MAX_PIXELS = 40 * 1000 * 1000
+
+# Images resized on demand by /api/recipe/recipes/<id>/image/ are kept
+# here, the least recently used ones are removed past the size limit
+IMAGE_CACHE_ROOT = '/vol/web/cache'
+IMAGE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+IMAGE_RESIZE_MAX_WIDTH = 2048
+
+# How the files of MEDIA_ROOT (and IMAGE_CACHE_ROOT) are sent:
+# 'python' streams them from Django, 'x-accel-redirect' lets nginx send
+# them from the internal locations below, 'x-sendfile' lets Apache or
+# lighttpd send them
+MEDIA_SERVE_MODE = os.environ.get('MEDIA_SERVE_MODE', 'python')
+MEDIA_ACCEL_PREFIX = '/protected/media/'
+IMAGE_CACHE_ACCEL_PREFIX = '/protected/cache/'
@@ -50,3 +50,9 @@ admin.site.register(models.Tag)
 admin.site.register(models.Ingredient)
 # Register the Recipe model to the admin (no need for a speacil Useradmin)
 admin.site.register(models.Recipe)
+# Register the ImageBlob model to see the shared image files
+admin.site.register(models.ImageBlob)
+# Register the ImageUploadSession model to see the uploads in progress
+admin.site.register(models.ImageUploadSession)
+# Register the ImportCheckpoint model to see how far the imports got
+admin.site.register(models.ImportCheckpoint)
@@ -0,0 +1,154 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, \
+                        StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+from core.storage import TEMP_DIR
+
+
+# Media names are never reused (uuid or content hash), so browsers and
+# proxies may keep them for a year without asking again
+MEDIA_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+# Bytes read at a time when a range has to be streamed by Python
+CHUNK_SIZE = 64 * 1024
+
+
+def serve_file(request, root, path, accel_prefix,
+               cache_control=MEDIA_CACHE_CONTROL):
+    """Return a response for the file at path inside root
+
+    Depending on the MEDIA_SERVE_MODE setting the web server is asked to
+    send the file (X-Accel-Redirect for nginx, X-Sendfile for Apache and
+    lighttpd) or it is sent by Django.
+    """
+    try:
+        full_path = safe_join(root, path)
+    except SuspiciousFileOperation:
+        raise Http404('Invalid path')
+    try:
+        stat = os.stat(full_path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404('File not found')
+    if not os.path.isfile(full_path):
+        raise Http404('File not found')
+
+    mode = settings.MEDIA_SERVE_MODE
+    if mode == 'x-accel-redirect':
+        # nginx maps the internal location to root and handles the
+        # conditional and range requests itself
+        response = HttpResponse(content_type=_content_type(full_path))
+        response['X-Accel-Redirect'] = accel_prefix + quote(path)
+    elif mode == 'x-sendfile':
+        response = HttpResponse(content_type=_content_type(full_path))
+        response['X-Sendfile'] = full_path
+    else:
+        response = _python_response(request, full_path, stat)
+
+    response['Cache-Control'] = cache_control
+    return response
+
+
+def _python_response(request, full_path, stat):
+    """Send the file from Django with validators and range support"""
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    last_modified = int(stat.st_mtime)
+
+    # 304 (or 412) when the client already has this version of the file
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        response = _range_response(request, full_path, stat.st_size, etag)
+    if response is None:
+        # FileResponse hands the file to the WSGI server's file_wrapper,
+        # which sends it with os.sendfile() when the server supports it
+        response = FileResponse(open(full_path, 'rb'))
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def _range_response(request, full_path, size, etag):
+    """Return a 206 or 416 response for a Range request, else None"""
+    header = request.META.get('HTTP_RANGE')
+    if not header or request.method != 'GET':
+        return None
+    # Send the whole file if it changed since the client got its part
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range != etag:
+        return None
+
+    match = RANGE_RE.match(header.strip())
+    if match is None:
+        # Several ranges or other units, we are allowed to ignore them
+        return None
+    start, end = match.groups()
+    if start:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    elif end:
+        # The last n bytes
+        start = max(size - int(end), 0)
+        end = size - 1
+    else:
+        return None
+
+    if start > end or start >= size:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    length = end - start + 1
+    response = StreamingHttpResponse(
+        _read_range(full_path, start, length),
+        status=206,
+        content_type=_content_type(full_path)
+    )
+    response['Content-Length'] = str(length)
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
+
+
+def _read_range(full_path, start, length):
+    """Yield length bytes of the file from start"""
+    with open(full_path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _content_type(full_path):
+    return mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+
+
+@require_safe
+def serve_media(request, path):
+    """Serve a file from MEDIA_ROOT"""
+    # The uploads still being received or hashed are not public
+    name = os.path.normpath(path)
+    if name == TEMP_DIR or name.startswith(TEMP_DIR + os.sep):
+        raise Http404('File not found')
+
+    return serve_file(
+        request,
+        settings.MEDIA_ROOT,
+        path,
+        settings.MEDIA_ACCEL_PREFIX
+    )
@@ -0,0 +1,57 @@
+# Generated by Django 3.1.14 on 2026-10-18 20:16
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_names(apps, schema_editor):
+    """Merge tags and ingredients with the same user and name"""
+    Recipe = apps.get_model('core', 'Recipe')
+    for model_name, field in (('Tag', 'tags'), ('Ingredient', 'ingredients')):
+        model = apps.get_model('core', model_name)
+        through = getattr(Recipe, field).through
+        column = f'{model_name.lower()}_id'
+
+        duplicates = model.objects.values('user_id', 'name').annotate(
+            keep=Min('id'),
+            count=Count('id')
+        ).filter(count__gt=1)
+        for duplicate in duplicates.iterator():
+            others = model.objects.filter(
+                user_id=duplicate['user_id'],
+                name=duplicate['name']
+            ).exclude(id=duplicate['keep']).values_list('id', flat=True)
+            # Move the recipes of every duplicate to the one we keep
+            for other in list(others):
+                linked = through.objects.filter(
+                    **{column: duplicate['keep']}
+                ).values('recipe_id')
+                through.objects.filter(
+                    **{column: other}, recipe_id__in=linked
+                ).delete()
+                through.objects.filter(
+                    **{column: other}
+                ).update(**{column: duplicate['keep']})
+                model.objects.filter(id=other).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_recipe_image'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_names,
+            migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='core_ingredient_user_name_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='core_tag_user_name_uniq'),
+        ),
+    ]
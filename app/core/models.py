@@ -1,11 +1,16 @@
-import uuid
 import os
-from django.db import models
+import uuid
+
+from django.db import connections, models, transaction
+from django.db.models import F
 # what we need to extand the user base model
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, \
                                         PermissionsMixin
 from django.conf import settings
 
+from core.storage import ContentAddressedStorage, TEMP_DIR, \
+                         sharded_image_path
+
 
 def recipe_image_file_path(instance, filename):
     """Generate file path for new recipe image"""
@@ -14,8 +19,9 @@ def recipe_image_file_path(instance, filename):
     # Create a new name using the uuid
     filename = f'{uuid.uuid4()}.{ext}'
 
-    # A relable method that allowed us to join 2 strings into a vaild path
-    return os.path.join('uploads/recipe/', filename)
+    # The uuid is random, so the files are spread evenly over the shards
+    # (the content addressed storage keeps only the extension of it)
+    return sharded_image_path(filename)
 
 
 # extends the BaseUserManager
@@ -71,6 +77,15 @@ class Tag(models.Model):
         on_delete=models.CASCADE,
     )
 
+    class Meta:
+        constraints = [
+            # A user can only have one tag with the same name
+            models.UniqueConstraint(
+                fields=['user', 'name'],
+                name='core_tag_user_name_uniq'
+            ),
+        ]
+
     def __str__(self):
         # return the string representation
         return self.name
@@ -87,12 +102,31 @@ class Ingredient(models.Model):
         on_delete=models.CASCADE,
     )
 
+    class Meta:
+        constraints = [
+            # A user can only have one ingredient with the same name
+            models.UniqueConstraint(
+                fields=['user', 'name'],
+                name='core_ingredient_user_name_uniq'
+            ),
+        ]
+
     def __str__(self):
         return self.name
 
 
 class Recipe(models.Model):
     """Recipe object"""
+    # The states of the background processing of the image
+    IMAGE_PENDING = 'pending'
+    IMAGE_READY = 'ready'
+    IMAGE_FAILED = 'failed'
+    IMAGE_STATUS_CHOICES = (
+        (IMAGE_PENDING, 'Pending'),
+        (IMAGE_READY, 'Ready'),
+        (IMAGE_FAILED, 'Failed'),
+    )
+
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -104,7 +138,119 @@ class Recipe(models.Model):
     # ManyToManyField = we could have many tags for example for one recipe
     ingredients = models.ManyToManyField('Ingredient')
     tags = models.ManyToManyField('Tag')
-    image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    # Files are named after their content, so the same photo uploaded to
+    # many recipes is stored once (see ImageBlob for the reference count)
+    image = models.ImageField(
+        null=True,
+        upload_to=recipe_image_file_path,
+        storage=ContentAddressedStorage()
+    )
+    # Empty until an image is uploaded
+    image_status = models.CharField(
+        max_length=10,
+        choices=IMAGE_STATUS_CHOICES,
+        blank=True,
+    )
+
+    class Meta:
+        indexes = [
+            # Lists filter by the user and walk the recipes by id
+            models.Index(
+                fields=['user', 'id'],
+                name='core_recipe_user_id_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.title
+
+
+class ImageBlobManager(models.Manager):
+
+    def acquire(self, name, size=0):
+        """Count one more recipe using the image file"""
+        table = connections[self.db].ops.quote_name(self.model._meta.db_table)
+        # One statement, so it can never increment a row that release is
+        # deleting: it waits for the lock of the row and inserts a new one
+        # if it is gone (PostgreSQL and SQLite both have ON CONFLICT)
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (name, size, ref_count) '
+                'VALUES (%s, %s, 1) ON CONFLICT (name) DO UPDATE '
+                f'SET ref_count = {table}.ref_count + 1',
+                [name, size]
+            )
+
+    def release(self, name):
+        """Count one recipe less, forgetting the file when none is left
+
+        The file is left on disk: an upload of the same content reuses it
+        before its acquire commits, and that row can not be seen from here.
+        collect_recipe_images deletes it, skipping the files touched lately.
+        """
+        with transaction.atomic():
+            # The update locks the row until the commit, so an acquire of
+            # the same name waits for us
+            self.filter(name=name, ref_count__gt=0).update(
+                ref_count=F('ref_count') - 1
+            )
+            self.filter(name=name, ref_count__lte=0).delete()
+
+
+class ImageBlob(models.Model):
+    """Image file shared by the recipes that uploaded the same content"""
+    name = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField(default=0)
+    ref_count = models.PositiveIntegerField(default=0)
+
+    objects = ImageBlobManager()
+
+    def __str__(self):
+        return self.name
+
+
+class ImageUploadSession(models.Model):
+    """Recipe image sent in chunks, that can be resumed after a failure"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4,
+                          editable=False)
+    recipe = models.ForeignKey('Recipe', on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    # The size of the whole file and how much of it was received
+    size = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Sessions not updated for IMAGE_UPLOAD_SESSION_TTL seconds expire
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def temp_name(self):
+        """Return the storage name of the file the chunks are written to"""
+        return os.path.join(TEMP_DIR, 'sessions', str(self.id))
+
+    def __str__(self):
+        return f'{self.filename} ({self.offset}/{self.size})'
+
+
+class ImportCheckpoint(models.Model):
+    """How far a bulk import of recipes got, to resume it after a failure
+
+    The input is split between the partitions by user, the line is the
+    last one of the input whose recipe of the partition was imported.
+    """
+    name = models.CharField(max_length=255)
+    partition = models.PositiveIntegerField()
+    partitions = models.PositiveIntegerField()
+    line = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'partition'],
+                name='core_importcheckpoint_name_partition_uniq'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} {self.partition}/{self.partitions}: ' \
+               f'line {self.line}'
@@ -0,0 +1,19 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from core.models import ImageBlob, ImageUploadSession, Recipe
+from core.storage import remove_file
+
+
+@receiver(post_delete, sender=Recipe)
+def release_recipe_image(sender, instance, **kwargs):
+    """Count one user less for the image of a deleted recipe"""
+    if instance.image:
+        ImageBlob.objects.release(instance.image.name)
+
+
+@receiver(post_delete, sender=ImageUploadSession)
+def remove_upload_session_file(sender, instance, **kwargs):
+    """Remove the chunks received by a finished or expired upload"""
+    storage = Recipe._meta.get_field('image').storage
+    remove_file(storage.path(instance.temp_name))
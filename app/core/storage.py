@@ -0,0 +1,107 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+# Where uploads are written while they are hashed, on the same file system
+# as the final location so they can be renamed into place
+TEMP_DIR = 'uploads/tmp'
+
+
+def sharded_image_path(filename):
+    """Return the path of a recipe image file inside two shard folders"""
+    # uploads/recipe/ab/cd/abcd....jpg, so no folder gets millions of files
+    return os.path.join('uploads/recipe/', filename[:2], filename[2:4],
+                        filename)
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """Return the SHA-256 hex digest of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def link_file(source, target):
+    """Make target the same file as source, return False if it is missing
+
+    Used to move files while the old path still has to work: link, point
+    the rows to the target, then remove the source.
+    """
+    if not os.path.exists(source):
+        # Moved by a run that stopped before removing the source
+        return os.path.exists(target)
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.link(source, target)
+    except FileExistsError:
+        # Left by a run that stopped, copied if it is not a link
+        if not os.path.samefile(source, target):
+            shutil.copy2(source, target)
+    except OSError:
+        # Hard links are not supported by every file system
+        shutil.copy2(source, target)
+
+    return True
+
+
+def remove_file(path):
+    """Remove the file if it exists"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Store every file under the SHA-256 hash of its content
+
+    Identical uploads get the same name and share a single file on disk.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # The final name comes from the content, in _save
+        return name
+
+    def _save(self, name, content):
+        ext = os.path.splitext(name)[1].lower()
+        digest = hashlib.sha256()
+
+        tmp_dir = self.path(TEMP_DIR)
+        os.makedirs(tmp_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            # Hash the file in the same pass that writes it to the disk
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    tmp.write(chunk)
+
+            name = sharded_image_path(f'{digest.hexdigest()}{ext}')
+            full_path = self.path(name)
+            if os.path.exists(full_path):
+                # We already have this content, touch it so the garbage
+                # collector sees it is in use again
+                os.remove(tmp_path)
+                os.utime(full_path)
+            else:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                os.chmod(tmp_path, self.file_permissions_mode or 0o644)
+                # Renaming is atomic, a concurrent upload of the same
+                # content just replaces the file with identical bytes
+                os.replace(tmp_path, full_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        return name
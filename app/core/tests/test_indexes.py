@@ -0,0 +1,66 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+
+from core.models import Tag, Ingredient, Recipe
+
+from recipe import filters
+
+
+class IndexUsageTests(TestCase):
+    """Test the query plans of the API use the composite indexes"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@rainwalk.io',
+            'testpass'
+        )
+        if connection.vendor == 'postgresql':
+            # The test tables are tiny, make the planner show the index it
+            # would use on a real table instead of a sequential scan
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, name):
+        """Assert the plan of the queryset mentions the index"""
+        plan = queryset.explain()
+        self.assertIn(name, plan)
+
+    def test_recipe_list_uses_user_id_index(self):
+        """Test the recipes of a user are read in id order from the index"""
+        queryset = Recipe.objects.filter(user=self.user).order_by('-id')
+
+        self.assertUsesIndex(queryset[:50], 'core_recipe_user_id_idx')
+
+    def test_tag_filter_uses_reverse_index(self):
+        """Test matching all tags reads the (tag_id, recipe_id) index"""
+        queryset = filters.filter_by_related(
+            Recipe.objects.filter(user=self.user), 'tags', [1, 2],
+            filters.MATCH_ALL
+        )
+
+        self.assertUsesIndex(queryset, 'core_recipe_tags_tag_recipe_idx')
+
+    def test_ingredient_filter_uses_reverse_index(self):
+        """Test matching all ingredients reads the reverse index"""
+        queryset = filters.filter_by_related(
+            Recipe.objects.filter(user=self.user), 'ingredients', [1, 2],
+            filters.MATCH_ALL
+        )
+
+        self.assertUsesIndex(
+            queryset,
+            'core_recipe_ingredients_ingredient_recipe_idx'
+        )
+
+    def test_name_lists_use_user_name_index(self):
+        """Test tags and ingredients are read by (user, name)"""
+        for model in (Tag, Ingredient):
+            queryset = model.objects.filter(user=self.user).order_by('-name')
+            if connection.vendor == 'sqlite':
+                # SQLite creates the unique constraint with the table
+                name = f'sqlite_autoindex_{model._meta.db_table}'
+            else:
+                name = f'{model._meta.db_table}_user_name_uniq'
+
+            self.assertUsesIndex(queryset, name)
@@ -0,0 +1,127 @@
+import os
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
+
+from core.storage import TEMP_DIR
+
+
+MEDIA_ROOT = tempfile.mkdtemp()
+CONTENT = bytes(range(256)) * 4
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, MEDIA_SERVE_MODE='python')
+class MediaServingTests(TestCase):
+    """Test serving the files of MEDIA_ROOT"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        os.makedirs(os.path.join(MEDIA_ROOT, 'uploads'), exist_ok=True)
+        with open(os.path.join(MEDIA_ROOT, 'uploads', 'a.jpg'), 'wb') as f:
+            f.write(CONTENT)
+        os.makedirs(os.path.join(MEDIA_ROOT, TEMP_DIR, 'sessions'))
+        with open(os.path.join(MEDIA_ROOT, TEMP_DIR, 'sessions', 'a'),
+                  'wb') as f:
+            f.write(CONTENT)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT)
+
+    def test_serve_file(self):
+        """Test the file is sent with validators and cache headers"""
+        res = self.client.get('/media/uploads/a.jpg')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(b''.join(res.streaming_content), CONTENT)
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        self.assertEqual(res['Content-Length'], str(len(CONTENT)))
+        self.assertIn('ETag', res)
+        self.assertIn('Last-Modified', res)
+        self.assertIn('max-age=31536000', res['Cache-Control'])
+
+    def test_temp_files_not_served(self):
+        """Test the uploads in progress can not be downloaded"""
+        for path in (f'{TEMP_DIR}/sessions/a', 'uploads/./tmp/sessions/a'):
+            res = self.client.get(f'/media/{path}')
+
+            self.assertEqual(res.status_code, 404)
+
+    def test_not_modified(self):
+        """Test a matching If-None-Match gets a 304 without the body"""
+        etag = self.client.get('/media/uploads/a.jpg')['ETag']
+
+        res = self.client.get('/media/uploads/a.jpg', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.content, b'')
+
+    def test_range(self):
+        """Test a byte range is returned as partial content"""
+        res = self.client.get('/media/uploads/a.jpg', HTTP_RANGE='bytes=10-19')
+
+        self.assertEqual(res.status_code, 206)
+        self.assertEqual(b''.join(res.streaming_content), CONTENT[10:20])
+        self.assertEqual(
+            res['Content-Range'],
+            f'bytes 10-19/{len(CONTENT)}'
+        )
+
+    def test_range_suffix(self):
+        """Test asking for the last bytes of the file"""
+        res = self.client.get('/media/uploads/a.jpg', HTTP_RANGE='bytes=-5')
+
+        self.assertEqual(res.status_code, 206)
+        self.assertEqual(b''.join(res.streaming_content), CONTENT[-5:])
+
+    def test_range_not_satisfiable(self):
+        """Test a range past the end of the file is rejected"""
+        res = self.client.get(
+            '/media/uploads/a.jpg',
+            HTTP_RANGE=f'bytes={len(CONTENT)}-'
+        )
+
+        self.assertEqual(res.status_code, 416)
+
+    def test_range_if_range_changed(self):
+        """Test the whole file is sent if If-Range does not match"""
+        res = self.client.get(
+            '/media/uploads/a.jpg',
+            HTTP_RANGE='bytes=0-9',
+            HTTP_IF_RANGE='"old"'
+        )
+
+        self.assertEqual(res.status_code, 200)
+
+    def test_missing_file(self):
+        """Test a missing file or a path outside the root is 404"""
+        res = self.client.get('/media/uploads/missing.jpg')
+        self.assertEqual(res.status_code, 404)
+
+        res = self.client.get('/media/../settings.py')
+        self.assertEqual(res.status_code, 404)
+
+    @override_settings(MEDIA_SERVE_MODE='x-accel-redirect')
+    def test_x_accel_redirect(self):
+        """Test nginx is asked to send the file"""
+        res = self.client.get('/media/uploads/a.jpg')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(
+            res['X-Accel-Redirect'],
+            '/protected/media/uploads/a.jpg'
+        )
+        self.assertEqual(res.content, b'')
+
+    @override_settings(MEDIA_SERVE_MODE='x-sendfile')
+    def test_x_sendfile(self):
+        """Test the server is asked to send the file from the disk"""
+        res = self.client.get('/media/uploads/a.jpg')
+
+        self.assertEqual(
+            res['X-Sendfile'],
+            os.path.join(MEDIA_ROOT, 'uploads', 'a.jpg')
+        )
@@ -88,6 +88,7 @@ class ModelTest(TestCase):
         file_path = models.recipe_image_file_path(None, 'myimage.jpg')
 
         # f alloes us to add variables into the stirngs (use {})
-        exp_path = f'uploads/recipe/{uuid}.jpg'
+        # The first characters of the uuid are used as two shard folders
+        exp_path = f'uploads/recipe/te/st/{uuid}.jpg'
 
         self.assertEqual(file_path, exp_path)
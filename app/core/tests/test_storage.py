@@ -0,0 +1,106 @@
+import hashlib
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase
+
+from core.models import ImageBlob, Recipe
+from core.storage import ContentAddressedStorage, sharded_image_path
+from core.tests.utils import TempMediaMixin
+
+from recipe import images
+
+
+class ContentAddressedStorageTests(TempMediaMixin, TestCase):
+
+    def setUp(self):
+        self.storage = ContentAddressedStorage()
+        self.user = get_user_model().objects.create_user(
+            'test@rainwalk.io',
+            'testpass'
+        )
+
+    def _recipe_with_image(self, content):
+        """Create a recipe and save the content as its image"""
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=10,
+            price=5.00
+        )
+        recipe.image.save('photo.JPG', ContentFile(content))
+        images.replace_image(recipe, None)
+        return recipe
+
+    def test_file_named_by_content(self):
+        """Test the name of a saved file is the hash of its content"""
+        name = self.storage.save('anything.jpg', ContentFile(b'image'))
+
+        digest = hashlib.sha256(b'image').hexdigest()
+        self.assertEqual(name, sharded_image_path(f'{digest}.jpg'))
+        self.assertTrue(self.storage.exists(name))
+
+    def test_same_content_stored_once(self):
+        """Test identical uploads share the file and count its users"""
+        recipe1 = self._recipe_with_image(b'image')
+        recipe2 = self._recipe_with_image(b'image')
+
+        self.assertEqual(recipe1.image.name, recipe2.image.name)
+        blob = ImageBlob.objects.get(name=recipe1.image.name)
+        self.assertEqual(blob.ref_count, 2)
+        self.assertEqual(blob.size, len(b'image'))
+
+    def test_delete_recipe_releases_image(self):
+        """Test deleting a recipe counts one user less for its image"""
+        recipe1 = self._recipe_with_image(b'image')
+        recipe2 = self._recipe_with_image(b'image')
+
+        recipe1.delete()
+        self.assertEqual(
+            ImageBlob.objects.get(name=recipe2.image.name).ref_count, 1
+        )
+
+        recipe2.delete()
+        self.assertFalse(ImageBlob.objects.exists())
+
+    def test_replace_image_releases_old_image(self):
+        """Test replacing an image counts one user less for the old one"""
+        recipe = self._recipe_with_image(b'old')
+        old_name = recipe.image.name
+
+        recipe.image.save('photo.jpg', ContentFile(b'new'))
+        images.replace_image(recipe, old_name)
+
+        self.assertFalse(ImageBlob.objects.filter(name=old_name).exists())
+        self.assertEqual(
+            ImageBlob.objects.get(name=recipe.image.name).ref_count, 1
+        )
+
+    def test_release_leaves_files(self):
+        """Test releasing the last user only forgets the file"""
+        recipe = self._recipe_with_image(b'image')
+        name = recipe.image.name
+        rendition = default_storage.save(
+            images.rendition_name(name, 'thumbnail'), ContentFile(b'r')
+        )
+
+        # The test transaction is never committed, run the hooks now
+        with patch('django.db.transaction.on_commit', lambda f: f()):
+            recipe.delete()
+
+        # An upload of the same content may already point to them, they
+        # are left to collect_recipe_images
+        self.assertFalse(ImageBlob.objects.filter(name=name).exists())
+        self.assertTrue(self.storage.exists(name))
+        self.assertTrue(default_storage.exists(rendition))
+
+    def test_acquire_counts_atomically(self):
+        """Test acquire creates the row or increments it in place"""
+        ImageBlob.objects.acquire('uploads/recipe/a.jpg', 5)
+        ImageBlob.objects.acquire('uploads/recipe/a.jpg', 5)
+
+        blob = ImageBlob.objects.get(name='uploads/recipe/a.jpg')
+        self.assertEqual(blob.ref_count, 2)
+        self.assertEqual(blob.size, 5)
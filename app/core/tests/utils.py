@@ -0,0 +1,46 @@
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.test import override_settings
+
+
+class TempMediaMixin:
+    """Give the tests a MEDIA_ROOT of their own, emptied after every test
+
+    Put it before TestCase in the bases, the directory is removed when
+    all the tests of the class ran.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls._media_root_override = override_settings(
+            MEDIA_ROOT=cls.media_root
+        )
+        cls._media_root_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._media_root_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def tearDown(self):
+        super().tearDown()
+        # The storages create the directory again when they write
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+
+class EmptyCacheMixin:
+    """Start every test with an empty cache
+
+    The test database reuses the ids of the users and recipes between
+    tests, so the versions and responses cached by one test would be
+    found by the next.
+    """
+
+    def setUp(self):
+        cache.clear()
+        super().setUp()
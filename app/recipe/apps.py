@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class RecipeConfig(AppConfig):
     name = 'recipe'
+
+    def ready(self):
+        # Connect the signals that keep the versions of the ETags
+        from recipe import signals  # noqa: F401
+        # Register the system checks of the caches
+        from recipe import checks  # noqa: F401
@@ -0,0 +1,78 @@
+from django.db import connection
+
+from core.models import Recipe
+
+
+def get_or_create_by_name(model, user, names):
+    """Return a {name: id} map, creating the names the user does not have"""
+    # Keep the first occurrence of every name, in the given order
+    names = list(dict.fromkeys(names))
+    if not names:
+        return {}
+
+    if connection.vendor == 'postgresql':
+        ids = _upsert_returning(model, user, names)
+        # A name committed by another request after our statement started
+        # is neither inserted nor visible to it, so ask once more
+        missing = [name for name in names if name not in ids]
+        if missing:
+            ids.update(_upsert_returning(model, user, missing))
+    else:
+        model.objects.bulk_create(
+            (model(user=user, name=name) for name in names),
+            ignore_conflicts=True
+        )
+        ids = dict(model.objects.filter(
+            user=user, name__in=names
+        ).values_list('name', 'id'))
+
+    return {name: ids[name] for name in names}
+
+
+def _upsert_returning(model, user, names):
+    """Insert the missing names and read every id in one round trip"""
+    table = connection.ops.quote_name(model._meta.db_table)
+    sql = f"""
+        WITH input AS (
+            SELECT DISTINCT unnest(%s::varchar[]) AS name
+        ), inserted AS (
+            INSERT INTO {table} (user_id, name)
+            SELECT %s, name FROM input
+            ON CONFLICT (user_id, name) DO NOTHING
+            RETURNING id, name
+        )
+        SELECT id, name FROM inserted
+        UNION ALL
+        SELECT existing.id, existing.name
+        FROM {table} AS existing
+        JOIN input ON existing.name = input.name
+        WHERE existing.user_id = %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [names, user.pk, user.pk])
+        return {name: pk for pk, name in cursor.fetchall()}
+
+
+def create_recipes(recipes, links):
+    """Insert the recipes and their links with a fixed number of queries
+
+    links maps a relation of the recipes (tags, ingredients) to the list of
+    the related ids of every recipe, in the order of the recipes.
+    """
+    if connection.features.can_return_rows_from_bulk_insert:
+        Recipe.objects.bulk_create(recipes)
+    else:
+        # The backend can not tell us the new ids of a bulk insert
+        for recipe in recipes:
+            recipe.save()
+
+    # One batched insert into the through table of each relation
+    for field, ids in links.items():
+        through = getattr(Recipe, field).through
+        model = Recipe._meta.get_field(field).related_model
+        column = f'{model._meta.model_name}_id'
+        through.objects.bulk_create(
+            through(recipe_id=recipe.id, **{column: pk})
+            for recipe, pks in zip(recipes, ids)
+            for pk in dict.fromkeys(pks)
+        )
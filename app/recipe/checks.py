@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, register
+from django.utils.module_loading import import_string
+
+
+# The caches every worker process must see the same data in
+SHARED_CACHES = (
+    ('API_VERSION_CACHE', 'the versions behind the ETags'),
+    ('API_RESPONSE_CACHE', 'the cached lists and recipe details'),
+)
+
+
+@register()
+def check_shared_caches(app_configs, **kwargs):
+    """Refuse caches in the memory of a process for data shared by all
+
+    A write would only reach the process that handled it, the others
+    would keep answering with the old data.
+    """
+    if settings.API_CACHE_SINGLE_PROCESS:
+        return []
+
+    errors = []
+    for setting, used_for in SHARED_CACHES:
+        alias = getattr(settings, setting)
+        backend = import_string(settings.CACHES[alias]['BACKEND'])
+        if issubclass(backend, LocMemCache):
+            errors.append(Error(
+                f'{setting} keeps {used_for} in the memory of every '
+                'process.',
+                hint='Configure a shared cache with CACHE_BACKEND and '
+                     'CACHE_LOCATION, or set API_CACHE_SINGLE_PROCESS=1 if '
+                     'a single process serves the API.',
+                id='recipe.E001',
+            ))
+
+    return errors
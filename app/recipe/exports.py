@@ -0,0 +1,173 @@
+import csv
+import json
+import time
+import zipfile
+from itertools import islice
+
+from core.models import Ingredient, Recipe, Tag
+
+from recipe.fast_serializers import FastListSerializer
+from recipe.serializers import IngredientSerializer, RecipeSerializer, \
+                               RecipeArchiveSerializer, TagSerializer
+
+
+# The export formats with their content type and file extension
+FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+}
+
+# Image files are copied into the archive in pieces of this size
+IMAGE_CHUNK_SIZE = 64 * 1024
+
+
+def iter_chunks(queryset, chunk_size, serializer_class=RecipeSerializer):
+    """Yield the objects in chunks, in the format of the list endpoints
+
+    The rows come from a server-side cursor and the many related ids are
+    read for one chunk at a time, so the memory used does not depend on
+    the number of objects.
+    """
+    fast = FastListSerializer(serializer_class)
+    rows = fast.values(queryset.order_by('id')).iterator(
+        chunk_size=chunk_size
+    )
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield fast.to_representation(chunk)
+
+
+def _dumps(data):
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+def ndjson_lines(chunks):
+    """Yield the recipes as one JSON object per line, a chunk at a time"""
+    for chunk in chunks:
+        yield ''.join(_dumps(recipe) + '\n' for recipe in chunk)
+
+
+class Echo:
+    """File-like object returning what is written, for csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(chunks):
+    """Yield the recipes as CSV rows with a header, a chunk at a time"""
+    writer = csv.writer(Echo())
+    fields = list(RecipeSerializer.Meta.fields)
+    yield writer.writerow(fields)
+    for chunk in chunks:
+        yield ''.join(
+            writer.writerow([
+                # The ids of the tags and ingredients in one cell
+                ' '.join(str(pk) for pk in recipe[field])
+                if isinstance(recipe[field], list) else recipe[field]
+                for field in fields
+            ])
+            for recipe in chunk
+        )
+
+
+def export(queryset, fmt, chunk_size):
+    """Return the iterator of the export of the recipes in the format"""
+    lines = ndjson_lines if fmt == 'ndjson' else csv_lines
+    return lines(iter_chunks(queryset, chunk_size))
+
+
+class ZipStream:
+    """Write-only file keeping what zipfile writes until it is sent
+
+    It can not seek or tell, so zipfile writes the sizes of the entries
+    after their data instead of going back, and the archive can be sent
+    while it is being written.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        """Return what was written since the last call"""
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _write_json_list(entry, chunks):
+    """Write the chunks of objects to the entry as one JSON array"""
+    entry.write(b'[')
+    first = True
+    for chunk in chunks:
+        for item in chunk:
+            entry.write((_dumps(item) if first else ',' + _dumps(item))
+                        .encode())
+            first = False
+        yield
+    entry.write(b']')
+
+
+def archive(user, queryset, chunk_size):
+    """Yield the bytes of a ZIP of the recipes, their tags and images
+
+    manifest.json has the recipes, tags and ingredients like the list
+    endpoints, with the path of every image in the archive. Nothing is
+    written to the disk and only a chunk of the archive is in memory.
+    """
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) \
+            as zf:
+        info = zipfile.ZipInfo('manifest.json', time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        with zf.open(info, 'w') as entry:
+            sections = (
+                ('recipes', iter_chunks(
+                    queryset, chunk_size, RecipeArchiveSerializer
+                )),
+                ('tags', iter_chunks(
+                    Tag.objects.filter(user=user), chunk_size, TagSerializer
+                )),
+                ('ingredients', iter_chunks(
+                    Ingredient.objects.filter(user=user),
+                    chunk_size,
+                    IngredientSerializer
+                )),
+            )
+            for index, (name, chunks) in enumerate(sections):
+                entry.write(f'{"{" if index == 0 else ","}"{name}":'.encode())
+                for _ in _write_json_list(entry, chunks):
+                    yield stream.pop()
+            entry.write(b'}')
+        yield stream.pop()
+
+        storage = Recipe._meta.get_field('image').storage
+        # Every file once, the same image can be used by many recipes
+        names = queryset.exclude(image='').exclude(
+            image__isnull=True
+        ).order_by('image').values_list('image', flat=True).distinct()
+        for name in names.iterator(chunk_size=chunk_size):
+            try:
+                image = storage.open(name, 'rb')
+            except FileNotFoundError:
+                continue
+            info = zipfile.ZipInfo(name, time.localtime()[:6])
+            # Images are compressed already
+            info.compress_type = zipfile.ZIP_STORED
+            with image, zf.open(info, 'w', force_zip64=True) as entry:
+                for data in iter(lambda: image.read(IMAGE_CHUNK_SIZE), b''):
+                    entry.write(data)
+                    yield stream.pop()
+            yield stream.pop()
+
+    # The central directory, written when the archive is closed
+    yield stream.pop()
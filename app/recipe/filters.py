@@ -0,0 +1,52 @@
+from django.db.models import Count, Exists, OuterRef
+
+from core.models import Recipe
+
+
+# The values accepted by the `match` query parameter
+MATCH_ANY = 'any'
+MATCH_ALL = 'all'
+MATCH_CHOICES = (MATCH_ANY, MATCH_ALL)
+
+# The through tables of the recipe many to many relations and the name of
+# the column that points to the related object
+RELATIONS = {
+    'tags': (Recipe.tags.through, 'tag_id'),
+    'ingredients': (Recipe.ingredients.through, 'ingredient_id'),
+}
+
+
+def filter_by_related(queryset, relation, ids, match=MATCH_ANY):
+    """Filter recipes linked to any or all of the given related ids"""
+    through, column = RELATIONS[relation]
+    # Remove duplicates so the count of matched ids is correct
+    ids = set(ids)
+
+    if match == MATCH_ALL:
+        # GROUP BY recipe_id HAVING COUNT(*) = number of ids, the through
+        # table is unique on (recipe, related) so every row is a new match
+        matching = through.objects.filter(
+            **{f'{column}__in': ids}
+        ).values('recipe_id').annotate(
+            matched=Count('recipe_id')
+        ).filter(matched=len(ids)).values('recipe_id')
+        return queryset.filter(id__in=matching)
+
+    # EXISTS stops at the first through row, and unlike a join it never
+    # returns the same recipe twice
+    return queryset.filter(Exists(through.objects.filter(
+        recipe_id=OuterRef('pk'),
+        **{f'{column}__in': ids}
+    )))
+
+
+def exclude_related(queryset, relation, ids):
+    """Remove recipes linked to any of the given related ids"""
+    through, column = RELATIONS[relation]
+
+    # NOT EXISTS is an anti join, it is answered from the through table
+    # index without loading the rows we want to throw away
+    return queryset.filter(~Exists(through.objects.filter(
+        recipe_id=OuterRef('pk'),
+        **{f'{column}__in': set(ids)}
+    )))
@@ -0,0 +1,168 @@
+import fcntl
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+
+from PIL import features
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from recipe import images
+
+
+# The formats the images can be resized to and their file extension
+FORMATS = {
+    'jpeg': ('JPEG', 'jpg'),
+    'png': ('PNG', 'png'),
+}
+# Pillow can be built without libwebp
+if features.check('webp'):
+    FORMATS['webp'] = ('WEBP', 'webp')
+
+# The file in the cache directory with the bytes of all the cached images,
+# so every process counts what the others write
+SIZE_FILE = '.size'
+# The files locking the images being created, one per first two digits
+# of the key so there is a bounded number of them and none is removed
+LOCK_DIR = '.locks'
+
+
+class ImageCache:
+    """Resized images on disk, evicting the least recently used"""
+
+    @property
+    def root(self):
+        return settings.IMAGE_CACHE_ROOT
+
+    def get_path(self, image_name, width, fmt):
+        """Return the path of the resized image, creating it on a miss"""
+        key = hashlib.sha1(
+            f'{image_name}:{width}:{fmt}'.encode()
+        ).hexdigest()
+        path = os.path.join(self.root, key[:2], f'{key}.{FORMATS[fmt][1]}')
+
+        if self._touch(path):
+            return path
+
+        # Concurrent requests for the same image, from any process, wait
+        # for the first one to make it
+        with self._locked(LOCK_DIR, key[:2]):
+            # Another request may have created it while we were waiting
+            if not self._touch(path):
+                self._create(image_name, width, fmt, path)
+
+        return path
+
+    def clear(self):
+        """Remove every cached image"""
+        with self._locked(SIZE_FILE) as f:
+            for entry in self._scan():
+                os.remove(entry.path)
+            self._write_size(f, 0)
+
+    def _touch(self, path):
+        """Mark the file as recently used, return False if it is missing"""
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+
+        return True
+
+    def _create(self, image_name, width, fmt, path):
+        """Resize the image and write it to the cache"""
+        image_format = FORMATS[fmt][0]
+        with default_storage.open(image_name, 'rb') as original:
+            img, _ = images.load_image(original, width)
+            # Only ever make the image smaller
+            if img.width > width:
+                height = max(1, round(img.height * width / img.width))
+                img = img.resize((width, height), reducing_gap=2.0)
+            img = images.prepare_for_format(img, image_format)
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file and rename it, so other processes
+            # never see a half written file
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            try:
+                with os.fdopen(fd, 'wb') as tmp:
+                    img.save(tmp, format=image_format)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+
+        self._added(os.path.getsize(path))
+
+    def _added(self, size):
+        """Count the new file and evict old files if the cache is full"""
+        with self._locked(SIZE_FILE) as f:
+            data = f.read()
+            if data:
+                total = int(data) + size
+            else:
+                # First use of the directory, the new file is counted too
+                total = sum(entry.stat().st_size for entry in self._scan())
+
+            if total > settings.IMAGE_CACHE_MAX_BYTES:
+                total = self._evict()
+            self._write_size(f, total)
+
+    @contextmanager
+    def _locked(self, *name):
+        """Open a file of the cache directory, locked against every process"""
+        # Every open() locks on its own, so the threads wait for each other
+        path = os.path.join(self.root, *name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        # Closing the file releases the lock
+        with open(fd, 'r+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            yield f
+
+    def _write_size(self, f, total):
+        f.seek(0)
+        f.truncate()
+        f.write(str(total))
+
+    def _evict(self):
+        """Remove the least recently used files and return the size left
+
+        The lock of the size file must be held. The directory is scanned,
+        so files removed behind our back are not counted any more.
+        """
+        entries = sorted(
+            ((entry.stat(), entry.path) for entry in self._scan()),
+            key=lambda item: item[0].st_mtime
+        )
+        size = sum(stat.st_size for stat, path in entries)
+        # Go a bit below the limit so we do not evict on every write
+        target = settings.IMAGE_CACHE_MAX_BYTES * 0.9
+        for stat, path in entries:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= stat.st_size
+
+        return size
+
+    def _scan(self):
+        """Yield the files of the cache directory"""
+        if not os.path.isdir(self.root):
+            return
+        for shard in os.scandir(self.root):
+            # Not the directory of the locks
+            if shard.is_dir() and not shard.name.startswith('.'):
+                for entry in os.scandir(shard.path):
+                    if entry.is_file() and not entry.name.startswith('tmp'):
+                        yield entry
+
+
+# The files, their total size and the locks are shared with the other
+# processes using the directory
+image_cache = ImageCache()
@@ -0,0 +1,180 @@
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+
+from core.models import Recipe, ImageBlob
+
+
+logger = logging.getLogger(__name__)
+
+# Where the original images are and where their renditions go
+IMAGE_DIR = 'uploads/recipe'
+RENDITIONS_DIR = 'uploads/recipe/renditions'
+# The name of every rendition and the longest side it can have
+RENDITIONS = getattr(settings, 'IMAGE_RENDITIONS', {
+    'thumbnail': 160,
+    'medium': 640,
+    'large': 1280,
+})
+
+# The modes the formats can save, the others (CMYK, 16 bit, ...) are
+# converted to RGB or RGBA
+SAVE_MODES = {
+    'JPEG': ('RGB', 'L'),
+    'PNG': ('RGB', 'RGBA', 'L', 'LA', 'P', '1', 'I', 'I;16'),
+    'WEBP': ('RGB', 'RGBA'),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def rendition_name(image_name, rendition):
+    """Return the storage name of a rendition of the image"""
+    # Same relative path (and format) as the original, under a directory
+    # per rendition, so the original can be found from a rendition
+    relative = os.path.relpath(image_name, IMAGE_DIR)
+    return os.path.join(RENDITIONS_DIR, rendition, relative)
+
+
+def rendition_urls(recipe):
+    """Return the URL of every rendition of a recipe image that is ready"""
+    if not recipe.image or recipe.image_status != Recipe.IMAGE_READY:
+        return {}
+
+    return {
+        rendition: default_storage.url(rendition_name(recipe.image.name,
+                                                      rendition))
+        for rendition in RENDITIONS
+    }
+
+
+def replace_image(recipe, old_name):
+    """Move the recipe's reference from the old image file to the new one"""
+    new_name = recipe.image.name
+    if new_name == old_name:
+        # The same content was uploaded again
+        return
+
+    ImageBlob.objects.acquire(new_name, recipe.image.size)
+    if old_name:
+        ImageBlob.objects.release(old_name)
+
+
+def create_renditions(recipe_id, image_name):
+    """Write the renditions of the image and record the result"""
+    status = Recipe.IMAGE_READY
+    try:
+        _write_renditions(image_name)
+    except Exception:
+        logger.exception('Could not process image %s', image_name)
+        status = Recipe.IMAGE_FAILED
+
+    # Only touch the recipe if the image was not replaced in the meantime
+    Recipe.objects.filter(
+        pk=recipe_id,
+        image=image_name
+    ).update(image_status=status)
+
+
+def _write_renditions(image_name):
+    """Decode the image once and write every rendition, biggest first"""
+    sizes = sorted(RENDITIONS.items(), key=lambda item: -item[1])
+    # Another recipe with the same image content already has them
+    if all(default_storage.exists(rendition_name(image_name, rendition))
+           for rendition in RENDITIONS):
+        return
+
+    with default_storage.open(image_name, 'rb') as original:
+        img, image_format = load_image(original, sizes[0][1])
+
+        for rendition, size in sizes:
+            # Every rendition is made from the previous (bigger) one
+            img.thumbnail((size, size), reducing_gap=2.0)
+            _save(img, image_format, rendition_name(image_name, rendition))
+
+
+def load_image(f, size):
+    """Decode an image that will be shrunk to fit in size x size"""
+    img = Image.open(f)
+    image_format = img.format
+    # Let the JPEG decoder scale down by up to 8x while decoding, so we
+    # never hold the full resolution image in memory
+    img.draft('RGB', (size, size))
+    # Apply the EXIF rotation, the EXIF data itself is not saved again
+    img = ImageOps.exif_transpose(img)
+
+    return img, image_format
+
+
+def prepare_for_format(img, image_format):
+    """Convert the image to a mode the format can save"""
+    modes = SAVE_MODES.get(image_format)
+    if modes is None or img.mode in modes:
+        return img
+
+    # PNG and WebP keep the transparency, JPEG can not
+    if 'RGBA' in modes and (
+        'A' in img.getbands() or 'transparency' in img.info
+    ):
+        return img.convert('RGBA')
+    return img.convert('RGB')
+
+
+def _save(img, image_format, name):
+    """Save the image with the given format to the storage"""
+    img = prepare_for_format(img, image_format)
+    buffer = io.BytesIO()
+    img.save(buffer, format=image_format, optimize=True)
+
+    # Renditions are rewritten in place instead of getting a new name
+    default_storage.delete(name)
+    default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def _run(recipe_id, image_name):
+    """Run the processing in a worker thread"""
+    try:
+        create_renditions(recipe_id, image_name)
+    finally:
+        # Worker threads open their own database connections
+        connections.close_all()
+
+
+def _get_executor():
+    """Return the worker pool of the process, starting it on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_PROCESSING_WORKERS,
+                thread_name_prefix='recipe-images'
+            )
+        return _executor
+
+
+def process_in_background(recipe):
+    """Create the renditions of the recipe image in the worker pool
+
+    The queue is in the memory of the process, the jobs lost when it
+    stops are picked up by manage.py process_pending_images.
+    """
+    args = (recipe.pk, recipe.image.name)
+
+    def submit():
+        if settings.IMAGE_PROCESSING_WORKERS:
+            _get_executor().submit(_run, *args)
+        else:
+            create_renditions(*args)
+
+    # Wait for the commit, so the worker sees the new image
+    transaction.on_commit(submit)
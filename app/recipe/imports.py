@@ -0,0 +1,337 @@
+import csv
+import io
+import json
+import zlib
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+
+import django
+from django.contrib.auth import get_user_model
+from django.contrib.auth.base_user import BaseUserManager
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+
+from core.models import ImportCheckpoint, Ingredient, Recipe, Tag
+
+from recipe import bulk, versions
+
+
+# The tags and ingredients of a recipe in one CSV cell
+NAME_SEPARATOR = '|'
+# The relations of a recipe and the models of their names
+RELATIONS = (('tags', Tag), ('ingredients', Ingredient))
+
+# A recipe of the input, checked and ready to be inserted
+Record = namedtuple('Record', [
+    'line', 'email', 'title', 'time_minutes', 'price', 'link', 'tags',
+    'ingredients',
+])
+
+
+class InvalidRecord(ValueError):
+    """A recipe of the input that can not be imported"""
+
+    def __init__(self, line, message):
+        super().__init__(f'Line {line}: {message}')
+        self.line = line
+
+
+def _max_length(model, field):
+    return model._meta.get_field(field).max_length
+
+
+def _text(line, data, field, required=True):
+    value = data.get(field)
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        raise InvalidRecord(line, f'{field} is required.')
+    if len(value) > _max_length(Recipe, field):
+        raise InvalidRecord(line, f'{field} is too long.')
+
+    return value
+
+
+def _names(line, data, field):
+    value = data.get(field) or []
+    if isinstance(value, str):
+        value = value.split(NAME_SEPARATOR)
+    if not isinstance(value, list):
+        raise InvalidRecord(line, f'{field} must be a list of names.')
+
+    names = [str(name).strip() for name in value]
+    if any(len(name) > _max_length(Tag, 'name') for name in names):
+        raise InvalidRecord(line, f'A name of {field} is too long.')
+
+    # Keep the first occurrence of every name, in the given order
+    return list(dict.fromkeys(name for name in names if name))
+
+
+def clean(line, data):
+    """Return the record of a recipe of the input, checking every field"""
+    if not isinstance(data, dict):
+        raise InvalidRecord(line, 'A recipe must be an object.')
+
+    email = BaseUserManager.normalize_email(str(data.get('user') or ''))
+    if '@' not in email or len(email) > 255:
+        raise InvalidRecord(line, 'user must be an email address.')
+
+    try:
+        time_minutes = int(data.get('time_minutes'))
+    except (TypeError, ValueError):
+        raise InvalidRecord(line, 'time_minutes must be an integer.')
+
+    field = Recipe._meta.get_field('price')
+    try:
+        price = Decimal(str(data.get('price'))).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise InvalidRecord(line, 'price must be a number.')
+    if not price.is_finite() or \
+            abs(price) >= 10 ** (field.max_digits - field.decimal_places):
+        raise InvalidRecord(line, 'price is out of range.')
+
+    return Record(
+        line=line,
+        email=email,
+        title=_text(line, data, 'title'),
+        time_minutes=time_minutes,
+        price=price,
+        link=_text(line, data, 'link', required=False),
+        tags=_names(line, data, 'tags'),
+        ingredients=_names(line, data, 'ingredients'),
+    )
+
+
+def read_records(f, fmt):
+    """Yield the records of an NDJSON or CSV input, one line at a time
+
+    In CSV the user, title, time_minutes, price and link are columns and
+    the tags and ingredients are names joined by NAME_SEPARATOR. Records
+    are numbered by their line in the input.
+    """
+    if fmt == 'ndjson':
+        for line, text in enumerate(f, 1):
+            if not text.strip():
+                continue
+            try:
+                data = json.loads(text)
+            except ValueError:
+                raise InvalidRecord(line, 'Not valid JSON.')
+            yield clean(line, data)
+    else:
+        reader = csv.DictReader(f)
+        for row in reader:
+            # The line the row ends on, a cell can hold line breaks
+            yield clean(reader.line_num, row)
+
+
+def partition(email, partitions):
+    """Return the partition of a user, the same in every run"""
+    return zlib.crc32(email.encode()) % partitions
+
+
+def checkpoints(name, partitions):
+    """Return the last line imported by every partition of an import"""
+    done = {}
+    for checkpoint in ImportCheckpoint.objects.filter(name=name):
+        if checkpoint.partitions != partitions:
+            raise ValueError(
+                f'The import {name} was started with '
+                f'{checkpoint.partitions} partitions, resume it with as many.'
+            )
+        done[checkpoint.partition] = checkpoint.line
+
+    return done
+
+
+def can_import_in_parallel():
+    """Return if batches can be imported by many processes at once"""
+    return connection.vendor == 'postgresql'
+
+
+def init_worker():
+    """Get a process of the pool ready to import batches"""
+    # Needed when processes are spawned rather than forked
+    django.setup()
+
+
+def import_batch(name, partition, partitions, records):
+    """Import a batch of records of a partition and move its checkpoint
+
+    The recipes, the missing users, tags and ingredients and the checkpoint
+    are written in one transaction, so a batch is imported once or not at
+    all. Returns the partition, the number of records, the last line and
+    the ids of the users whose data changed (see bump_versions).
+    """
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            user_ids = _copy_batch(records)
+        else:
+            user_ids = _orm_batch(records)
+
+        ImportCheckpoint.objects.update_or_create(
+            name=name,
+            partition=partition,
+            defaults={'partitions': partitions, 'line': records[-1].line}
+        )
+
+    return partition, len(records), records[-1].line, user_ids
+
+
+def bump_versions(user_ids):
+    """Give the collections of the users a new version after an import
+
+    The rows are inserted without the save signals. Called by the process
+    running the command once the batch committed, the processes of the
+    pool may not see the cache of the web processes.
+    """
+    for user_id in user_ids:
+        versions.bump_user(
+            user_id,
+            versions.RECIPES,
+            versions.TAGS,
+            versions.INGREDIENTS,
+            versions.RECIPE_TAGS,
+            versions.RECIPE_INGREDIENTS
+        )
+
+
+def _copy(cursor, table, rows):
+    """Load the rows into a table with COPY, as quoted CSV"""
+    buffer = io.StringIO()
+    # Quoted so an empty string is not read as NULL
+    csv.writer(buffer, quoting=csv.QUOTE_ALL).writerows(rows)
+    buffer.seek(0)
+    cursor.copy_expert(f'COPY {table} FROM STDIN WITH (FORMAT csv)', buffer)
+
+
+def _copy_batch(records):
+    """Import the records on PostgreSQL, with set-based statements
+
+    The batch is loaded into temporary staging tables with COPY, then
+    every step (users, recipe ids, recipes, names, links) is a single
+    statement over the whole batch.
+    """
+    qn = connection.ops.quote_name
+    users = qn(get_user_model()._meta.db_table)
+    recipes = qn(Recipe._meta.db_table)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TEMPORARY TABLE import_recipe ('
+            'line bigint PRIMARY KEY, email varchar(255), '
+            'title varchar(255), time_minutes integer, price numeric(5, 2), '
+            'link varchar(255), user_id integer, recipe_id integer'
+            ') ON COMMIT DROP'
+        )
+        _copy(
+            cursor,
+            'import_recipe (line, email, title, time_minutes, price, link)',
+            ((r.line, r.email, r.title, r.time_minutes, r.price, r.link)
+             for r in records)
+        )
+
+        # Users that are new get an unusable password, they can reset it
+        cursor.execute(
+            f'INSERT INTO {users} (email, password, name, is_active, '
+            'is_staff, is_superuser) '
+            "SELECT DISTINCT email, %s, '', true, false, false "
+            'FROM import_recipe ON CONFLICT (email) DO NOTHING',
+            [make_password(None)]
+        )
+        cursor.execute(
+            f'UPDATE import_recipe AS i SET user_id = u.id FROM {users} AS u '
+            'WHERE u.email = i.email'
+        )
+
+        # Take the ids up front, so the links can be inserted with them
+        cursor.execute(
+            'UPDATE import_recipe SET recipe_id = '
+            'nextval(pg_get_serial_sequence(%s, %s))',
+            [Recipe._meta.db_table, 'id']
+        )
+        cursor.execute(
+            f'INSERT INTO {recipes} (id, user_id, title, time_minutes, '
+            "price, link, image_status) SELECT recipe_id, user_id, title, "
+            "time_minutes, price, link, '' FROM import_recipe"
+        )
+
+        for field, model in RELATIONS:
+            staging = f'import_{model._meta.model_name}'
+            names = qn(model._meta.db_table)
+            through = qn(getattr(Recipe, field).through._meta.db_table)
+            column = f'{model._meta.model_name}_id'
+            cursor.execute(
+                f'CREATE TEMPORARY TABLE {staging} ('
+                'line bigint, name varchar(255)) ON COMMIT DROP'
+            )
+            _copy(cursor, staging, (
+                (r.line, name) for r in records for name in getattr(r, field)
+            ))
+            cursor.execute(
+                f'INSERT INTO {names} (user_id, name) '
+                'SELECT DISTINCT i.user_id, n.name '
+                f'FROM {staging} AS n JOIN import_recipe AS i USING (line) '
+                'ON CONFLICT (user_id, name) DO NOTHING'
+            )
+            cursor.execute(
+                f'INSERT INTO {through} (recipe_id, {column}) '
+                'SELECT i.recipe_id, o.id '
+                f'FROM {staging} AS n JOIN import_recipe AS i USING (line) '
+                f'JOIN {names} AS o '
+                'ON o.user_id = i.user_id AND o.name = n.name'
+            )
+
+        cursor.execute('SELECT DISTINCT user_id FROM import_recipe')
+        user_ids = [user_id for user_id, in cursor.fetchall()]
+        # ON COMMIT DROP only when this is the outermost transaction, the
+        # next batch of an outer one would find the tables
+        cursor.execute('DROP TABLE import_recipe, {}'.format(', '.join(
+            f'import_{model._meta.model_name}' for field, model in RELATIONS
+        )))
+
+        return user_ids
+
+
+def _orm_batch(records):
+    """Import the records with the ORM, on the other databases"""
+    User = get_user_model()
+    emails = list(dict.fromkeys(r.email for r in records))
+    password = make_password(None)
+    User.objects.bulk_create(
+        (User(email=email, password=password) for email in emails),
+        ignore_conflicts=True
+    )
+    user_ids = dict(User.objects.filter(
+        email__in=emails
+    ).values_list('email', 'id'))
+
+    names = {}
+    for r in records:
+        for field, model in RELATIONS:
+            names.setdefault((field, r.email), []).extend(getattr(r, field))
+    ids = {}
+    for field, model in RELATIONS:
+        for email in emails:
+            ids[field, email] = bulk.get_or_create_by_name(
+                model, User(pk=user_ids[email]), names[field, email]
+            )
+
+    recipes = [
+        Recipe(
+            user_id=user_ids[r.email],
+            title=r.title,
+            time_minutes=r.time_minutes,
+            price=r.price,
+            link=r.link
+        )
+        for r in records
+    ]
+    bulk.create_recipes(recipes, {
+        field: [
+            [ids[field, r.email][name] for name in getattr(r, field)]
+            for r in records
+        ]
+        for field, model in RELATIONS
+    })
+
+    return list(user_ids.values())
@@ -0,0 +1,112 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Tag, Recipe
+
+from recipe import filters
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the recipe tag filters"""
+    help = (
+        'Seed users with many recipes and tags (rolled back at the end) and '
+        'time the tag filters of the recipe API'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=3)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument('--tags', type=int, default=40)
+        # How many tags each recipe gets and how many the filter asks for
+        parser.add_argument('--tags-per-recipe', type=int, default=5)
+        parser.add_argument('--filter-tags', type=int, default=3)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        # Everything we create is thrown away when the benchmark is done
+        with transaction.atomic():
+            users = self._seed(rng, options)
+            self._run(rng, users, options)
+            transaction.set_rollback(True)
+
+    def _seed(self, rng, options):
+        """Create the users, tags, recipes and the links between them"""
+        self.stdout.write('Seeding data...')
+        users = []
+        for i in range(options['users']):
+            user = get_user_model().objects.create_user(
+                f'benchmark-{i}@rainwalk.io', 'benchmark'
+            )
+            Tag.objects.bulk_create(
+                Tag(user=user, name=f'Tag {n}') for n in range(options['tags'])
+            )
+            Recipe.objects.bulk_create(
+                (
+                    Recipe(
+                        user=user,
+                        title=f'Recipe {n}',
+                        time_minutes=10,
+                        price=5,
+                    )
+                    for n in range(options['recipes'])
+                ),
+                batch_size=1000
+            )
+            # Read the ids back since not every backend returns them
+            tag_ids = list(
+                Tag.objects.filter(user=user).values_list('id', flat=True)
+            )
+            recipe_ids = Recipe.objects.filter(
+                user=user
+            ).values_list('id', flat=True)
+            k = min(options['tags_per_recipe'], len(tag_ids))
+            Recipe.tags.through.objects.bulk_create(
+                (
+                    Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+                    for recipe_id in recipe_ids
+                    for tag_id in rng.sample(tag_ids, k)
+                ),
+                batch_size=1000
+            )
+            users.append((user, tag_ids))
+
+        return users
+
+    def _run(self, rng, users, options):
+        """Time every filter strategy and print the best run of each"""
+        strategies = (
+            ('join (legacy)', lambda qs, ids: qs.filter(tags__id__in=ids)),
+            ('any (EXISTS)', lambda qs, ids: filters.filter_by_related(
+                qs, 'tags', ids, filters.MATCH_ANY
+            )),
+            ('all (HAVING COUNT)', lambda qs, ids: filters.filter_by_related(
+                qs, 'tags', ids, filters.MATCH_ALL
+            )),
+        )
+
+        for name, apply_filter in strategies:
+            best = None
+            rows = 0
+            for _ in range(options['repeat']):
+                user, tag_ids = rng.choice(users)
+                ids = rng.sample(
+                    tag_ids, min(options['filter_tags'], len(tag_ids))
+                )
+                queryset = apply_filter(Recipe.objects.filter(user=user), ids)
+
+                start = time.perf_counter()
+                rows = len(queryset.values_list('id', flat=True))
+                elapsed = time.perf_counter() - start
+
+                best = elapsed if best is None else min(best, elapsed)
+
+            self.stdout.write(
+                f'{name:<20} best {best * 1000:8.2f} ms  ({rows} rows)'
+            )
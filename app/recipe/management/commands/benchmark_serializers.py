@@ -0,0 +1,124 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Prefetch
+
+from rest_framework.renderers import JSONRenderer
+
+from core.models import Ingredient, Recipe, Tag
+
+from recipe import serializers
+from recipe.fast_serializers import FastListSerializer
+
+
+class Command(BaseCommand):
+    """Django command to compare the list serializers with the fast path"""
+    help = (
+        'Seed a user with recipes, tags and ingredients (rolled back at the '
+        'end) and time the list serializers against the values() fast path'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=200)
+        parser.add_argument('--tags', type=int, default=40)
+        parser.add_argument('--tags-per-recipe', type=int, default=5)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        # Everything we create is thrown away when the benchmark is done
+        with transaction.atomic():
+            user = self._seed(options)
+            self._run(user, options)
+            transaction.set_rollback(True)
+
+    def _seed(self, options):
+        """Create the user, the tags, ingredients and recipes"""
+        self.stdout.write('Seeding data...')
+        user = get_user_model().objects.create_user(
+            'benchmark-serializers@rainwalk.io', 'benchmark'
+        )
+        tags = [
+            Tag.objects.create(user=user, name=f'Tag {n}')
+            for n in range(options['tags'])
+        ]
+        ingredients = [
+            Ingredient.objects.create(user=user, name=f'Ingredient {n}')
+            for n in range(options['tags'])
+        ]
+        k = min(options['tags_per_recipe'], options['tags'])
+        for n in range(options['recipes']):
+            recipe = Recipe.objects.create(
+                user=user,
+                title=f'Recipe {n}',
+                time_minutes=10,
+                price=5,
+            )
+            # Walk the tags so every recipe gets a different set
+            start = n % max(len(tags) - k, 1)
+            recipe.tags.add(*tags[start:start + k])
+            recipe.ingredients.add(*ingredients[start:start + k])
+
+        return user
+
+    def _run(self, user, options):
+        """Time both ways of serializing every list, print the best runs"""
+        recipes = Recipe.objects.filter(user=user).order_by('-id')
+        cases = (
+            (
+                'recipes',
+                serializers.RecipeSerializer,
+                # The prefetches the list used before the fast path
+                recipes.prefetch_related(
+                    Prefetch('tags', queryset=Tag.objects.only('id')),
+                    Prefetch(
+                        'ingredients',
+                        queryset=Ingredient.objects.only('id')
+                    ),
+                ),
+                recipes,
+            ),
+            (
+                'tags',
+                serializers.TagSerializer,
+                Tag.objects.filter(user=user).order_by('-name'),
+                Tag.objects.filter(user=user).order_by('-name'),
+            ),
+        )
+        renderer = JSONRenderer()
+
+        for name, serializer_class, queryset, rows in cases:
+            fast = FastListSerializer(serializer_class)
+            slow_time, slow_output = self._best(
+                options['repeat'],
+                lambda: renderer.render(
+                    serializer_class(queryset.all(), many=True).data
+                )
+            )
+            fast_time, fast_output = self._best(
+                options['repeat'],
+                lambda: renderer.render(
+                    fast.to_representation(fast.values(rows.all()))
+                )
+            )
+            same = 'same output' if slow_output == fast_output \
+                else 'DIFFERENT OUTPUT'
+
+            self.stdout.write(
+                f'{name:<8} serializer {slow_time * 1000:8.2f} ms  '
+                f'fast {fast_time * 1000:8.2f} ms  '
+                f'{slow_time / fast_time:5.1f}x  ({same})'
+            )
+
+    def _best(self, repeat, run):
+        """Return the best time of the runs and the output of the last"""
+        best = None
+        output = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            output = run()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+
+        return best, output
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from recipe import metrics
+
+
+class Command(BaseCommand):
+    """Django command to print the hit rate of the API response caches"""
+    help = 'Print the hits and misses of the API response caches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true',
+                            help='Start counting again from zero')
+
+    def handle(self, *args, **options):
+        for name, counts in metrics.get_counts().items():
+            total = counts['hit'] + counts['miss']
+            rate = counts['hit'] / total * 100 if total else 0
+            self.stdout.write(
+                f'{name:<16} {counts["hit"]:>10} hits '
+                f'{counts["miss"]:>10} misses {rate:6.1f}%'
+            )
+
+        if options['reset']:
+            metrics.reset()
+            self.stdout.write(self.style.SUCCESS('Counters reset'))
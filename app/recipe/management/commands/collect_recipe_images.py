@@ -0,0 +1,121 @@
+import os
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from core.models import ImageBlob, Recipe
+from core.storage import remove_file
+
+from recipe import images
+
+
+class Command(BaseCommand):
+    """Django command to delete the image files no recipe uses"""
+    help = (
+        'Walk uploads/recipe/ and delete the images and renditions that no '
+        'recipe points to, in batches, reporting the reclaimed bytes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        # Seconds to wait between batches, to go easy on a live system
+        parser.add_argument('--sleep', type=float, default=0)
+        # Files younger than this may belong to an upload in progress
+        parser.add_argument('--min-age', type=int, default=24 * 60 * 60,
+                            help='Keep files modified in the last seconds')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.deleted = 0
+        self.reclaimed = 0
+        cutoff = time.time() - options['min_age']
+
+        batch = []
+        for path, name, stat in self._walk(default_storage.path(
+            images.IMAGE_DIR
+        )):
+            if stat.st_mtime > cutoff:
+                continue
+            batch.append((path, name, stat.st_size))
+            if len(batch) >= options['batch_size']:
+                self._collect_batch(batch, cutoff)
+                batch = []
+        if batch:
+            self._collect_batch(batch, cutoff)
+
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {self.deleted} files, {self.reclaimed} bytes reclaimed'
+        ))
+
+    def _walk(self, root):
+        """Yield the path, image name and stat of every file under root
+
+        The tree is read one directory at a time with os.scandir, so the
+        memory used does not depend on the number of files.
+        """
+        media_root = default_storage.path('')
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = os.scandir(directory)
+            except FileNotFoundError:
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        name = os.path.relpath(entry.path, media_root)
+                        yield entry.path, name, entry.stat()
+
+    def _original_name(self, name):
+        """Return the image a file belongs to, itself or its rendition"""
+        if not name.startswith(images.RENDITIONS_DIR + '/'):
+            return name
+        # renditions/<rendition>/<path> is a rendition of uploads/recipe/<path>
+        relative = os.path.relpath(name, images.RENDITIONS_DIR)
+        return os.path.join(
+            images.IMAGE_DIR, relative.split('/', 1)[-1]
+        )
+
+    def _collect_batch(self, batch, cutoff):
+        """Delete the files of the batch no recipe points to"""
+        originals = {self._original_name(name) for path, name, size in batch}
+        used = set(
+            Recipe.objects.filter(image__in=originals).values_list(
+                'image', flat=True
+            )
+        )
+        removed = []
+
+        for path, name, size in batch:
+            if self._original_name(name) in used:
+                continue
+            if self.options['dry_run']:
+                self.stdout.write(f'Orphan: {name}')
+            else:
+                try:
+                    # An upload of the same content touches the file, so
+                    # check again right before deleting it
+                    if os.stat(path).st_mtime > cutoff:
+                        continue
+                except FileNotFoundError:
+                    continue
+                remove_file(path)
+                removed.append(name)
+            self.deleted += 1
+            self.reclaimed += size
+
+        if removed:
+            # Counts left behind for files nobody uses any more
+            ImageBlob.objects.filter(name__in=removed).delete()
+            self.stdout.write(
+                f'Deleted {self.deleted} files, '
+                f'{self.reclaimed} bytes reclaimed...'
+            )
+            if self.options['sleep']:
+                time.sleep(self.options['sleep'])
@@ -0,0 +1,143 @@
+import os
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from core.models import Recipe, ImageBlob
+from core.storage import hash_file, link_file, remove_file, \
+                         sharded_image_path
+
+from recipe import images
+
+
+# Names given by the content addressed storage
+CONTENT_ADDRESSED_RE = (
+    r'^uploads/recipe/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.[^/]*)?$'
+)
+
+
+class Command(BaseCommand):
+    """Django command to store existing recipe images by their content"""
+    help = (
+        'Rename the recipe images uploaded before the content addressed '
+        'storage to the hash of their content, so identical files are kept '
+        'once, and count the recipes using every file'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+        # Seconds to wait between batches, to go easy on a live system
+        parser.add_argument('--sleep', type=float, default=0)
+        # Rebuild the reference counts of every content addressed file
+        parser.add_argument('--recount', action='store_true')
+
+    def handle(self, *args, **options):
+        # Only the images not renamed yet, so the command can be stopped
+        # and run again
+        legacy = Recipe.objects.exclude(
+            image__regex=CONTENT_ADDRESSED_RE
+        ).exclude(image='').exclude(image__isnull=True).order_by('pk')
+        last_pk = 0
+        renamed = 0
+        reclaimed = 0
+
+        while True:
+            batch = list(
+                legacy.filter(pk__gt=last_pk).values_list('pk', 'image')[
+                    :options['batch_size']
+                ]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+
+            count, size = self._dedupe_batch(batch)
+            renamed += count
+            reclaimed += size
+            self.stdout.write(
+                f'Renamed {renamed} images, reclaimed {reclaimed} bytes...'
+            )
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        if options['recount']:
+            self._recount()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Done, {renamed} images renamed, {reclaimed} bytes reclaimed'
+        ))
+
+    def _dedupe_batch(self, batch):
+        """Link every file to its hash name, update the rows, unlink"""
+        linked = []
+        for pk, name in batch:
+            path = default_storage.path(name)
+            if not os.path.exists(path):
+                self.stderr.write(f'Missing file for recipe {pk}: {name}')
+                continue
+
+            ext = os.path.splitext(name)[1].lower()
+            new_name = sharded_image_path(f'{hash_file(path)}{ext}')
+            duplicate = default_storage.exists(new_name)
+            link_file(path, default_storage.path(new_name))
+            for rendition in images.RENDITIONS:
+                new_rendition = images.rendition_name(new_name, rendition)
+                if not default_storage.exists(new_rendition):
+                    link_file(
+                        default_storage.path(
+                            images.rendition_name(name, rendition)
+                        ),
+                        default_storage.path(new_rendition)
+                    )
+            linked.append((pk, name, new_name, duplicate))
+
+        # Both names work until the rows point to the new one
+        renamed = []
+        with transaction.atomic():
+            for pk, name, new_name, duplicate in linked:
+                if Recipe.objects.filter(pk=pk, image=name).update(
+                    image=new_name
+                ):
+                    ImageBlob.objects.acquire(
+                        new_name, default_storage.size(new_name)
+                    )
+                    renamed.append((name, duplicate))
+
+        reclaimed = 0
+        for name, duplicate in renamed:
+            # Another recipe may still use the old name
+            if Recipe.objects.filter(image=name).exists():
+                continue
+            if duplicate:
+                reclaimed += default_storage.size(name)
+            remove_file(default_storage.path(name))
+            for rendition in images.RENDITIONS:
+                remove_file(default_storage.path(
+                    images.rendition_name(name, rendition)
+                ))
+
+        return len(renamed), reclaimed
+
+    def _recount(self):
+        """Set the reference count of every file from the recipes"""
+        self.stdout.write('Counting the recipes of every image...')
+        counts = Recipe.objects.filter(
+            image__regex=CONTENT_ADDRESSED_RE
+        ).values('image').annotate(count=Count('id')).order_by()
+
+        with transaction.atomic():
+            for row in counts.iterator():
+                ImageBlob.objects.update_or_create(
+                    name=row['image'],
+                    defaults={
+                        'ref_count': row['count'],
+                        'size': default_storage.size(row['image']),
+                    }
+                )
+            # Files no recipe uses any more
+            ImageBlob.objects.exclude(
+                name__in=counts.values('image')
+            ).update(ref_count=0)
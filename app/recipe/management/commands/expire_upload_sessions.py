@@ -0,0 +1,49 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from core.models import ImageUploadSession
+from core.storage import TEMP_DIR, remove_file
+
+from recipe import uploads
+
+
+class Command(BaseCommand):
+    """Django command to remove the chunked uploads that were abandoned"""
+    help = (
+        'Delete the upload sessions that did not receive a chunk for '
+        'IMAGE_UPLOAD_SESSION_TTL seconds, and the temp files left behind'
+    )
+
+    def handle(self, *args, **options):
+        # The files are removed by the post_delete signal of every session
+        expired, _ = ImageUploadSession.objects.filter(
+            updated_at__lt=uploads.expiry_cutoff()
+        ).delete()
+
+        # Temp files of uploads interrupted by a crash have no session
+        cutoff = time.time() - settings.IMAGE_UPLOAD_SESSION_TTL
+        sessions = set(
+            str(pk) for pk in
+            ImageUploadSession.objects.values_list('pk', flat=True)
+        )
+        removed = 0
+        for directory in (TEMP_DIR, os.path.join(TEMP_DIR, 'sessions')):
+            try:
+                entries = os.scandir(default_storage.path(directory))
+            except FileNotFoundError:
+                continue
+            with entries:
+                for entry in entries:
+                    if not entry.is_file() or entry.name in sessions:
+                        continue
+                    if entry.stat().st_mtime < cutoff:
+                        remove_file(entry.path)
+                        removed += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Expired {expired} upload sessions, removed {removed} temp files'
+        ))
@@ -0,0 +1,123 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import DatabaseError, connections
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import ImportCheckpoint
+
+from recipe import imports
+
+
+class Command(BaseCommand):
+    """Django command to import recipes from an NDJSON or CSV file"""
+    help = (
+        'Stream recipes with the email of their user and the names of their '
+        'tags and ingredients from NDJSON or CSV into the database, in '
+        'batches that can be resumed after a failure'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=('ndjson', 'csv'),
+                            help='By default from the file extension')
+        # The checkpoints of the import are kept under this name
+        parser.add_argument('--name',
+                            help='Name of the import, the file name by '
+                                 'default')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        # Every process imports the recipes of its own users
+        parser.add_argument('--workers', type=int, default=1)
+        parser.add_argument('--reset', action='store_true',
+                            help='Forget the checkpoints and start over')
+
+    def handle(self, path, **options):
+        fmt = options['format'] or (
+            'csv' if path.lower().endswith('.csv') else 'ndjson'
+        )
+        self.name = options['name'] or os.path.basename(path)
+        self.batch_size = max(1, options['batch_size'])
+        self.partitions = max(1, options['workers'])
+        if self.partitions > 1 and not imports.can_import_in_parallel():
+            self.stderr.write(
+                'This database can not import in parallel, using one process'
+            )
+            self.partitions = 1
+
+        if options['reset']:
+            ImportCheckpoint.objects.filter(name=self.name).delete()
+        try:
+            self.done = imports.checkpoints(self.name, self.partitions)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.imported = 0
+        self.skipped = 0
+        self.started = time.monotonic()
+        try:
+            with open(path, newline='', encoding='utf-8') as f:
+                records = imports.read_records(f, fmt)
+                if self.partitions == 1:
+                    self._import(records, None)
+                else:
+                    # The processes must not share the connections of this one
+                    connections.close_all()
+                    with ProcessPoolExecutor(
+                        self.partitions,
+                        initializer=imports.init_worker
+                    ) as pool:
+                        self._import(records, pool)
+        except (imports.InvalidRecord, DatabaseError) as e:
+            raise CommandError(
+                f'{e} Imported {self.imported} recipes, run the command again '
+                'to resume.'
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {self.imported} recipes in '
+            f'{time.monotonic() - self.started:.1f}s, skipped '
+            f'{self.skipped} imported before'
+        ))
+
+    def _import(self, records, pool):
+        """Split the records by user into batches and import them"""
+        buffers = {}
+        running = {}
+        for record in records:
+            partition = imports.partition(record.email, self.partitions)
+            if record.line <= self.done.get(partition, 0):
+                self.skipped += 1
+                continue
+            batch = buffers.setdefault(partition, [])
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                self._submit(pool, running, partition, buffers.pop(partition))
+
+        for partition, batch in buffers.items():
+            self._submit(pool, running, partition, batch)
+        for future in running.values():
+            self._report(*future.result())
+
+    def _submit(self, pool, running, partition, batch):
+        """Import a batch, after the previous batch of its partition"""
+        # One batch of a partition at a time, in the order of the input, so
+        # its checkpoint only moves forward and memory stays bounded
+        if partition in running:
+            self._report(*running.pop(partition).result())
+
+        args = (self.name, partition, self.partitions, batch)
+        if pool is None:
+            self._report(*imports.import_batch(*args))
+        else:
+            running[partition] = pool.submit(imports.import_batch, *args)
+
+    def _report(self, partition, count, line, user_ids):
+        """Print the progress after a batch was imported"""
+        imports.bump_versions(user_ids)
+        self.imported += count
+        elapsed = max(time.monotonic() - self.started, 0.001)
+        self.stdout.write(
+            f'{self.imported} recipes imported ({self.imported / elapsed:.0f}'
+            f'/s), partition {partition} up to line {line}'
+        )
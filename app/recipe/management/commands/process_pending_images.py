@@ -0,0 +1,58 @@
+import os
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from core.models import Recipe
+
+from recipe import images
+
+
+class Command(BaseCommand):
+    """Django command to process the images whose job was lost"""
+    help = (
+        'Create the renditions of the recipe images still pending after '
+        'the minimum age, for jobs lost when a worker process stopped'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        # Younger images may still be in the queue of a worker
+        parser.add_argument('--min-age', type=int, default=10 * 60,
+                            help='Skip images uploaded in the last seconds')
+
+    def handle(self, *args, **options):
+        cutoff = time.time() - options['min_age']
+        processed = 0
+        last_id = 0
+        while True:
+            # Walk the pending recipes by id, the processed ones leave the
+            # filter so the batches can not be read with OFFSET
+            batch = list(Recipe.objects.filter(
+                image_status=Recipe.IMAGE_PENDING,
+                id__gt=last_id
+            ).order_by('id').values_list('id', 'image')[
+                :options['batch_size']
+            ])
+            if not batch:
+                break
+            last_id = batch[-1][0]
+
+            for recipe_id, name in batch:
+                if self._uploaded_at(name) > cutoff:
+                    continue
+                # Marks the recipe ready, or failed if the file is gone
+                images.create_renditions(recipe_id, name)
+                processed += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {processed} pending images'
+        ))
+
+    def _uploaded_at(self, name):
+        """Return when the image file was last uploaded, 0 if it is gone"""
+        try:
+            return os.stat(default_storage.path(name)).st_mtime
+        except FileNotFoundError:
+            return 0
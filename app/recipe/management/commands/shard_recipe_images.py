@@ -0,0 +1,99 @@
+import os
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Recipe
+from core.storage import sharded_image_path, link_file, remove_file
+
+from recipe import images
+
+
+class Command(BaseCommand):
+    """Django command to move flat recipe images into shard folders"""
+    help = (
+        'Move the images of uploads/recipe/ into uploads/recipe/ab/cd/ and '
+        'update Recipe.image in batches, it can be stopped and run again'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        # Seconds to wait between batches, to go easy on a live database
+        parser.add_argument('--sleep', type=float, default=0)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        # Only the images still in the flat layout, so a second run picks
+        # up where an interrupted one stopped
+        flat = Recipe.objects.filter(
+            image__regex=r'^uploads/recipe/[^/]+$'
+        ).order_by('pk')
+        last_pk = 0
+        moved = 0
+
+        while True:
+            batch = list(
+                flat.filter(pk__gt=last_pk).values_list('pk', 'image')[
+                    :options['batch_size']
+                ]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+
+            if options['dry_run']:
+                for pk, name in batch:
+                    self.stdout.write(f'{name} -> {self._new_name(name)}')
+                moved += len(batch)
+                continue
+
+            moved += self._move_batch(batch)
+            self.stdout.write(f'Moved {moved} images...')
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'Done, {moved} images moved'))
+
+    def _new_name(self, name):
+        return sharded_image_path(os.path.basename(name))
+
+    def _move_batch(self, batch):
+        """Link the files to their new path, update the rows, unlink"""
+        linked = []
+        for pk, name in batch:
+            new_name = self._new_name(name)
+            # The renditions are moved along with the original
+            pairs = [(name, new_name)] + [
+                (images.rendition_name(name, rendition),
+                 images.rendition_name(new_name, rendition))
+                for rendition in images.RENDITIONS
+            ]
+            if not link_file(default_storage.path(name),
+                             default_storage.path(new_name)):
+                self.stderr.write(f'Missing file for recipe {pk}: {name}')
+                continue
+            for old, new in pairs[1:]:
+                link_file(default_storage.path(old),
+                          default_storage.path(new))
+            linked.append((pk, name, new_name, pairs))
+
+        # The old and the new path both work until the rows are updated,
+        # so the images are never missing while the site is running
+        with transaction.atomic():
+            updated = [
+                (pairs, Recipe.objects.filter(pk=pk, image=name).update(
+                    image=new_name
+                ))
+                for pk, name, new_name, pairs in linked
+            ]
+
+        for pairs, count in updated:
+            # If the image was replaced meanwhile, the new path is unused
+            # and gets removed instead
+            index = 0 if count else 1
+            for pair in pairs:
+                remove_file(default_storage.path(pair[index]))
+
+        return sum(count for pairs, count in updated)
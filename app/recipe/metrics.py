@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core.cache import caches
+
+
+# The caches of the API responses that count their hits and misses
+NAMES = ('tag-list', 'ingredient-list', 'recipe-detail')
+
+
+def _cache():
+    return caches[settings.API_RESPONSE_CACHE]
+
+
+def _key(name, result):
+    return f'metrics:{name}:{result}'
+
+
+def _all_keys():
+    return [
+        _key(name, result) for name in NAMES for result in ('hit', 'miss')
+    ]
+
+
+def record(name, hit):
+    """Count a hit or a miss of a response cache"""
+    cache = _cache()
+    key = _key(name, 'hit' if hit else 'miss')
+    # Shared by every worker, incr is atomic on the shared backends
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Evicted in the meantime
+            cache.add(key, 1, timeout=None)
+
+
+def get_counts():
+    """Return the hits and misses of every response cache"""
+    values = _cache().get_many(_all_keys())
+
+    return {
+        name: {
+            'hit': values.get(_key(name, 'hit'), 0),
+            'miss': values.get(_key(name, 'miss'), 0),
+        }
+        for name in NAMES
+    }
+
+
+def reset():
+    """Start counting again from zero"""
+    _cache().delete_many(_all_keys())
@@ -0,0 +1,13 @@
+from rest_framework.pagination import CursorPagination
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Keyset pagination for the recipes of a user"""
+    # Recipes are already filtered by the user, so ordering by the id walks
+    # the (user_id, id) index and every page is a `WHERE id < cursor` lookup
+    # instead of an OFFSET that gets slower the deeper the page is
+    ordering = '-id'
+    page_size = 50
+    # Allow the client to ask for a smaller or bigger page (up to the max)
+    page_size_query_param = 'page_size'
+    max_page_size = 200
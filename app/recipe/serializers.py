@@ -1,6 +1,13 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+
 from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+from core.models import Tag, Ingredient, Recipe, ImageUploadSession
 
-from core.models import Tag, Ingredient, Recipe
+from recipe import bulk, images
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -21,6 +28,15 @@ class IngredientSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
+class NameListSerializer(serializers.Serializer):
+    """Serializer for a list of tag or ingredient names"""
+    names = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        allow_empty=False,
+        max_length=1000
+    )
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     """Serializer for a recipe object"""
     ingredients = serializers.PrimaryKeyRelatedField(
@@ -39,6 +55,99 @@ class RecipeSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
+class ImagePathField(serializers.CharField):
+    """The storage name of an image file, null when there is none"""
+
+    def to_representation(self, value):
+        return str(value) or None
+
+
+class RecipeArchiveSerializer(RecipeSerializer):
+    """Serializer for the recipes of the archive export"""
+    # The path of the image file in the archive, the name in the storage
+    image = ImagePathField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('image',)
+
+
+class RecipeBulkListSerializer(serializers.ListSerializer):
+    """Validate and create many recipes with a fixed number of queries"""
+    # The biggest batch we accept in one request
+    max_items = 1000
+    # The relations and the models their ids must belong to
+    relations = (('tags', Tag), ('ingredients', Ingredient))
+
+    def to_internal_value(self, data):
+        """Check every tag and ingredient id with one query per field"""
+        if isinstance(data, list) and len(data) > self.max_items:
+            msg = _('No more than {max_items} recipes per request')
+            raise serializers.ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [
+                    msg.format(max_items=self.max_items)
+                ]
+            }, code='max_length')
+
+        # Errors raised here (unlike in validate) keep one entry per item
+        attrs = super().to_internal_value(data)
+
+        user = self.context['request'].user
+        errors = [{} for item in attrs]
+        for field, model in self.relations:
+            wanted = {pk for item in attrs for pk in item[field]}
+            found = set(model.objects.filter(
+                user=user, id__in=wanted
+            ).values_list('id', flat=True)) if wanted else set()
+
+            # Report the missing ids on the item that asked for them
+            for item, item_errors in zip(attrs, errors):
+                missing = [pk for pk in item[field] if pk not in found]
+                if missing:
+                    item_errors[field] = [
+                        f'Invalid pk "{pk}" - object does not exist.'
+                        for pk in missing
+                    ]
+
+        if any(errors):
+            raise serializers.ValidationError(errors)
+
+        return attrs
+
+    def create(self, validated_data):
+        """Insert the recipes and all their links in one transaction"""
+        recipes = []
+        links = {field: [] for field, model in self.relations}
+        for attrs in validated_data:
+            for field in links:
+                links[field].append(attrs.pop(field))
+            recipes.append(Recipe(**attrs))
+
+        with transaction.atomic():
+            bulk.create_recipes(recipes, links)
+
+        return recipes
+
+
+class RecipeBulkSerializer(serializers.ModelSerializer):
+    """Serializer for one recipe of a bulk create"""
+    # Plain ids, they are all checked at once by the list serializer
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(),
+        default=list
+    )
+    tags = serializers.ListField(
+        child=serializers.IntegerField(),
+        default=list
+    )
+
+    class Meta:
+        model = Recipe
+        fields = ('id', 'title', 'ingredients', 'tags', 'time_minutes',
+                  'price', 'link')
+        read_only_fields = ('id',)
+        list_serializer_class = RecipeBulkListSerializer
+
+
 class RecipeDetailSerializer(RecipeSerializer):
     """Serialize a recipe detail"""
     # We are using the already define seralizer to write less code
@@ -48,8 +157,41 @@ class RecipeDetailSerializer(RecipeSerializer):
 
 class RecipeImageSerializer(serializers.ModelSerializer):
     """Serializer for uploading images to recipes"""
+    # The URLs of the resized copies, once the background job made them
+    renditions = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'image')
-        read_onlt_fields = ('id',)
+        fields = ('id', 'image', 'image_status', 'renditions')
+        read_only_fields = ('id', 'image_status')
+
+    def get_renditions(self, obj):
+        request = self.context.get('request')
+        urls = images.rendition_urls(obj)
+        if request is not None:
+            urls = {
+                name: request.build_absolute_uri(url)
+                for name, url in urls.items()
+            }
+
+        return urls
+
+
+class ImageUploadSessionSerializer(serializers.ModelSerializer):
+    """Serializer for the sessions of chunked image uploads"""
+
+    class Meta:
+        model = ImageUploadSession
+        fields = ('id', 'filename', 'size', 'offset', 'created_at')
+        read_only_fields = ('id', 'offset', 'created_at')
+
+    def validate_size(self, value):
+        """Refuse empty files and files over the upload limit"""
+        if not 0 < value <= settings.IMAGE_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                _('Ensure this value is between 1 and %(max)d.') % {
+                    'max': settings.IMAGE_UPLOAD_MAX_SIZE
+                }
+            )
+
+        return value
@@ -0,0 +1,94 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, \
+                                     pre_delete
+from django.dispatch import receiver
+
+from core.models import Ingredient, Recipe, Tag
+
+from recipe import versions
+
+
+# The versions of a tag or ingredient, and of their use by the recipes
+ATTR_VERSIONS = {
+    Tag: (versions.TAGS, versions.RECIPE_TAGS),
+    Ingredient: (versions.INGREDIENTS, versions.RECIPE_INGREDIENTS),
+}
+
+
+def bump_recipes(recipe_ids):
+    """Give the recipes a new version"""
+    if recipe_ids:
+        versions.bump([versions.recipe_key(pk) for pk in recipe_ids])
+
+
+def recipes_using(instance):
+    """Return the ids of the recipes that use a tag or an ingredient"""
+    return list(instance.recipe_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, **kwargs):
+    """Give the recipe and the recipes of its user a new version"""
+    versions.bump([
+        versions.recipe_key(instance.pk),
+        versions.user_key(instance.user_id, versions.RECIPES),
+    ])
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    """Give the recipes and the tags and ingredients in use a new version"""
+    recipe_saved(sender, instance)
+    versions.bump_user(
+        instance.user_id,
+        versions.RECIPE_TAGS,
+        versions.RECIPE_INGREDIENTS
+    )
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_relations_changed(sender, instance, action, reverse, model,
+                             pk_set, **kwargs):
+    """Give the recipes a new version when their tags or ingredients do"""
+    if not reverse:
+        if action.startswith('post_'):
+            kind, relation = ATTR_VERSIONS[model]
+            recipe_saved(Recipe, instance)
+            versions.bump_user(instance.user_id, relation)
+        return
+
+    # Changed from the tag or ingredient, pk_set has the recipes
+    if action == 'pre_clear':
+        bump_recipes(recipes_using(instance))
+    elif action in ('post_add', 'post_remove'):
+        bump_recipes(pk_set)
+    if action.startswith('post_'):
+        kind, relation = ATTR_VERSIONS[type(instance)]
+        versions.bump_user(instance.user_id, versions.RECIPES, relation)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def attr_saved(sender, instance, created, **kwargs):
+    """Give the tags or the ingredients of the user a new version"""
+    kind, relation = ATTR_VERSIONS[sender]
+    versions.bump_user(instance.user_id, kind)
+    if not created:
+        # The recipe details show the name
+        bump_recipes(recipes_using(instance))
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def attr_deleting(sender, instance, **kwargs):
+    """Give the recipes losing a tag or an ingredient a new version"""
+    # After the delete the recipes using it can not be found any more
+    bump_recipes(recipes_using(instance))
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def attr_deleted(sender, instance, **kwargs):
+    """Give the tags or ingredients, and the recipes, a new version"""
+    kind, relation = ATTR_VERSIONS[sender]
+    versions.bump_user(instance.user_id, kind, relation, versions.RECIPES)
@@ -0,0 +1,130 @@
+from django.db import connection
+
+from core.models import Ingredient, Recipe, Tag
+
+
+# The SQL building the JSON of the recipes, for every database that can.
+# The keys are in the order of the serializers, the price is a string with
+# both decimals like the DecimalField of the serializers gives it.
+TEMPLATES = {
+    'postgresql': {
+        'object': 'json_build_object',
+        'price': 'r.price::text',
+        # An aggregate over no rows is NULL
+        'ids': (
+            "COALESCE((SELECT json_agg(l.{column} ORDER BY l.{column}) "
+            "FROM {through} AS l WHERE l.recipe_id = r.id), '[]'::json)"
+        ),
+        'nested': (
+            "COALESCE((SELECT json_agg(json_build_object("
+            "'id', o.id, 'name', o.name) ORDER BY o.id) "
+            "FROM {through} AS l JOIN {table} AS o ON o.id = l.{column} "
+            "WHERE l.recipe_id = r.id), '[]'::json)"
+        ),
+        # Cast to text, psycopg2 would decode json into Python objects
+        'list': (
+            "SELECT COALESCE(json_agg(page.recipe ORDER BY page.id DESC), "
+            "'[]'::json)::text FROM (SELECT {recipe} AS recipe, r.id "
+            "FROM {recipes} AS r WHERE r.id IN ({ids})) AS page"
+        ),
+        'detail': (
+            'SELECT ({recipe})::text FROM {recipes} AS r '
+            'WHERE r.id = %s AND r.user_id = %s'
+        ),
+    },
+    'sqlite': {
+        'object': 'json_object',
+        'price': "printf('%%.2f', r.price)",
+        # json_group_array has no ORDER BY, it keeps the order of the rows
+        # of an ordered subquery. A subquery loses the JSON subtype of its
+        # result, json() gives it back so it is not embedded as a string.
+        'ids': (
+            'json((SELECT json_group_array(l.{column}) FROM '
+            '(SELECT {column} FROM {through} WHERE recipe_id = r.id '
+            'ORDER BY {column}) AS l))'
+        ),
+        'nested': (
+            "json((SELECT json_group_array(json_object("
+            "'id', o.id, 'name', o.name)) FROM "
+            "(SELECT t.id, t.name FROM {through} AS l "
+            "JOIN {table} AS t ON t.id = l.{column} "
+            "WHERE l.recipe_id = r.id ORDER BY t.id) AS o))"
+        ),
+        'list': (
+            'SELECT json_group_array(json(page.recipe)) FROM '
+            '(SELECT {recipe} AS recipe FROM {recipes} AS r '
+            'WHERE r.id IN ({ids}) ORDER BY r.id DESC) AS page'
+        ),
+        'detail': (
+            'SELECT {recipe} FROM {recipes} AS r '
+            'WHERE r.id = %s AND r.user_id = %s'
+        ),
+    },
+}
+
+
+def supported():
+    """Return if the database in use can build the recipe JSON"""
+    return connection.vendor in TEMPLATES
+
+
+def _table(model):
+    return connection.ops.quote_name(model._meta.db_table)
+
+
+def _recipe_object(templates, nested):
+    """Return the SQL of the JSON object of recipe r"""
+    related = {}
+    for relation, model in (('ingredients', Ingredient), ('tags', Tag)):
+        related[relation] = templates['nested' if nested else 'ids'].format(
+            through=_table(
+                Recipe._meta.get_field(relation).remote_field.through
+            ),
+            table=_table(model),
+            column=f'{model._meta.model_name}_id'
+        )
+
+    return (
+        f"{templates['object']}("
+        "'id', r.id, "
+        "'title', r.title, "
+        f"'ingredients', {related['ingredients']}, "
+        f"'tags', {related['tags']}, "
+        "'time_minutes', r.time_minutes, "
+        f"'price', {templates['price']}, "
+        "'link', r.link)"
+    )
+
+
+def _fetch(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+
+    return None if row is None else row[0].encode()
+
+
+def recipe_list(ids):
+    """Return the JSON bytes of the recipes of a list page, newest first"""
+    if not ids:
+        return b'[]'
+
+    templates = TEMPLATES[connection.vendor]
+    sql = templates['list'].format(
+        recipe=_recipe_object(templates, nested=False),
+        recipes=_table(Recipe),
+        ids=', '.join(['%s'] * len(ids))
+    )
+
+    return _fetch(sql, list(ids))
+
+
+def recipe_detail(recipe_id, user_id):
+    """Return the JSON bytes of a recipe of the user, None if not found"""
+    templates = TEMPLATES[connection.vendor]
+    sql = templates['detail'].format(
+        recipe=_recipe_object(templates, nested=True),
+        recipes=_table(Recipe)
+    )
+
+    return _fetch(sql, [recipe_id, user_id])
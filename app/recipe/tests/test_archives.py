@@ -0,0 +1,146 @@
+import io
+import json
+import zipfile
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from core.tests.utils import TempMediaMixin
+
+from recipe import exports
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+ARCHIVE_URL = reverse('recipe:recipe-archive')
+
+
+@override_settings(RECIPE_EXPORT_CHUNK_SIZE=2)
+class RecipeArchiveTests(TempMediaMixin, TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@rainwalk.io',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.ingredient = Ingredient.objects.create(
+            user=self.user, name='Kale'
+        )
+        self.recipes = []
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title=f'Recipe {i}',
+                time_minutes=10,
+                price=Decimal('5'),
+            )
+            recipe.tags.add(self.tag)
+            recipe.ingredients.add(self.ingredient)
+            self.recipes.append(recipe)
+
+        # Larger than a read, so it is copied in more than one piece
+        self.image_data = bytes(range(256)) * 1024
+        storage = Recipe._meta.get_field('image').storage
+        self.image_name = storage.save(
+            'uploads/recipe/sample.jpg', ContentFile(self.image_data)
+        )
+        # Two recipes sharing the same file
+        Recipe.objects.filter(pk__in=[r.pk for r in self.recipes[:2]]) \
+            .update(image=self.image_name)
+
+        other = get_user_model().objects.create_user(
+            'other@rainwalk.io',
+            'testpass'
+        )
+        Tag.objects.create(user=other, name='Other')
+        Recipe.objects.create(
+            user=other, title='Other', time_minutes=1, price=Decimal('1')
+        )
+
+    def _archive(self, res):
+        data = b''.join(res.streaming_content)
+        return zipfile.ZipFile(io.BytesIO(data))
+
+    def test_archive_manifest(self):
+        """Test the manifest has the recipes, tags and ingredients"""
+        res = self.client.get(ARCHIVE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/zip')
+        self.assertIn('recipes.zip', res['Content-Disposition'])
+        self.assertEqual(res['Cache-Control'], 'private, no-store')
+        with self._archive(res) as zf:
+            self.assertIsNone(zf.testzip())
+            manifest = json.loads(zf.read('manifest.json'))
+
+        listed = self.client.get(RECIPES_URL).data['results']
+        for recipe in manifest['recipes']:
+            image = recipe.pop('image')
+            expected = self.image_name \
+                if recipe['id'] != self.recipes[2].id else None
+            self.assertEqual(image, expected)
+        self.assertEqual(
+            manifest['recipes'],
+            json.loads(json.dumps(sorted(listed, key=lambda r: r['id'])))
+        )
+        self.assertEqual(
+            manifest['tags'], [{'id': self.tag.id, 'name': 'Vegan'}]
+        )
+        self.assertEqual(
+            manifest['ingredients'],
+            [{'id': self.ingredient.id, 'name': 'Kale'}]
+        )
+
+    def test_archive_images(self):
+        """Test every image file is in the archive once, unchanged"""
+        res = self.client.get(ARCHIVE_URL)
+
+        with self._archive(res) as zf:
+            names = zf.namelist()
+            self.assertEqual(names, ['manifest.json', self.image_name])
+            self.assertEqual(zf.read(self.image_name), self.image_data)
+            info = zf.getinfo(self.image_name)
+            self.assertEqual(info.compress_type, zipfile.ZIP_STORED)
+
+    def test_archive_is_streamed(self):
+        """Test the archive is sent in pieces while it is written"""
+        res = self.client.get(ARCHIVE_URL)
+        pieces = [piece for piece in res.streaming_content if piece]
+
+        self.assertGreater(len(pieces), 3)
+        self.assertLessEqual(
+            max(len(piece) for piece in pieces),
+            exports.IMAGE_CHUNK_SIZE + 1024
+        )
+
+    def test_archive_skips_missing_files(self):
+        """Test an image file that is gone does not break the archive"""
+        Recipe._meta.get_field('image').storage.delete(self.image_name)
+
+        res = self.client.get(ARCHIVE_URL)
+
+        with self._archive(res) as zf:
+            self.assertEqual(zf.namelist(), ['manifest.json'])
+
+    def test_archive_filtered(self):
+        """Test the filters of the list apply to the archive"""
+        res = self.client.get(ARCHIVE_URL, {'tags': str(self.tag.id)})
+
+        with self._archive(res) as zf:
+            manifest = json.loads(zf.read('manifest.json'))
+        self.assertEqual(len(manifest['recipes']), 3)
+
+    def test_archive_requires_auth(self):
+        """Test the archive is only for logged in users"""
+        res = APIClient().get(ARCHIVE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
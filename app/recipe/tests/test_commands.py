@@ -0,0 +1,320 @@
+import hashlib
+import io
+import os
+import time
+from io import StringIO
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase
+
+from core.models import ImageBlob, Recipe
+from core.storage import sharded_image_path
+from core.tests.utils import TempMediaMixin
+
+from recipe import images, metrics
+
+
+class BenchmarkCommandTests(TestCase):
+
+    def test_benchmark_filters(self):
+        """Test the filter benchmark runs and leaves no data behind"""
+        out = StringIO()
+        call_command(
+            'benchmark_filters',
+            users=1, recipes=20, tags=5, repeat=1,
+            stdout=out
+        )
+
+        self.assertIn('all (HAVING COUNT)', out.getvalue())
+        self.assertFalse(Recipe.objects.exists())
+
+
+class BenchmarkSerializersCommandTests(TestCase):
+
+    def test_benchmark_serializers(self):
+        """Test the fast path gives the same output and leaves no data"""
+        out = StringIO()
+        call_command(
+            'benchmark_serializers',
+            recipes=10, tags=5, repeat=1,
+            stdout=out
+        )
+
+        self.assertEqual(out.getvalue().count('(same output)'), 2)
+        self.assertFalse(Recipe.objects.exists())
+
+
+class CacheMetricsCommandTests(TestCase):
+
+    def test_cache_metrics(self):
+        """Test the hit rates are printed and can be reset"""
+        metrics.reset()
+        metrics.record('recipe-detail', hit=True)
+        metrics.record('recipe-detail', hit=True)
+        metrics.record('recipe-detail', hit=False)
+        metrics.record('recipe-detail', hit=True)
+        out = StringIO()
+
+        call_command('cache_metrics', reset=True, stdout=out)
+
+        self.assertIn('75.0%', out.getvalue())
+        self.assertEqual(
+            metrics.get_counts()['recipe-detail'], {'hit': 0, 'miss': 0}
+        )
+
+
+class ShardRecipeImagesCommandTests(TempMediaMixin, TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@rainwalk.io',
+            'testpass'
+        )
+
+    def _flat_recipe(self, filename):
+        """Create a recipe with an image in the old flat layout"""
+        name = default_storage.save(
+            f'uploads/recipe/{filename}', ContentFile(b'image')
+        )
+        return Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=10,
+            price=5.00,
+            image=name
+        )
+
+    def test_shard_recipe_images(self):
+        """Test flat images are moved into the shard folders"""
+        recipe = self._flat_recipe('abcdef.jpg')
+        rendition = images.rendition_name(recipe.image.name, 'thumbnail')
+        default_storage.save(rendition, ContentFile(b'thumbnail'))
+
+        call_command('shard_recipe_images', stdout=StringIO())
+
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image.name, 'uploads/recipe/ab/cd/abcdef.jpg')
+        self.assertTrue(default_storage.exists(recipe.image.name))
+        self.assertFalse(default_storage.exists('uploads/recipe/abcdef.jpg'))
+        self.assertFalse(default_storage.exists(rendition))
+        self.assertTrue(default_storage.exists(
+            images.rendition_name(recipe.image.name, 'thumbnail')
+        ))
+
+    def test_shard_recipe_images_resumes(self):
+        """Test a run interrupted after linking the file can be resumed"""
+        recipe = self._flat_recipe('abcdef.jpg')
+        # A previous run linked the new path but did not update the row
+        os.makedirs(os.path.join(self.media_root, 'uploads/recipe/ab/cd'))
+        os.link(
+            default_storage.path('uploads/recipe/abcdef.jpg'),
+            default_storage.path('uploads/recipe/ab/cd/abcdef.jpg')
+        )
+
+        call_command('shard_recipe_images', batch_size=1, stdout=StringIO())
+
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image.name, 'uploads/recipe/ab/cd/abcdef.jpg')
+        self.assertFalse(default_storage.exists('uploads/recipe/abcdef.jpg'))
+
+    def test_shard_recipe_images_dry_run(self):
+        """Test the dry run only prints the moves"""
+        recipe = self._flat_recipe('abcdef.jpg')
+        out = StringIO()
+
+        call_command('shard_recipe_images', dry_run=True, stdout=out)
+
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image.name, 'uploads/recipe/abcdef.jpg')
+        self.assertIn('uploads/recipe/ab/cd/abcdef.jpg', out.getvalue())
+
+
+class DedupeRecipeImagesCommandTests(TempMediaMixin, TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@rainwalk.io',
+            'testpass'
+        )
+
+    def _legacy_recipe(self, name, content):
+        """Create a recipe with an image saved under a random name"""
+        path = default_storage.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=10,
+            price=5.00,
+            image=name
+        )
+
+    def test_dedupe_recipe_images(self):
+        """Test identical images are renamed to a single shared file"""
+        recipe1 = self._legacy_recipe('uploads/recipe/ab/cd/abcd.jpg', b'img')
+        recipe2 = self._legacy_recipe('uploads/recipe/ef/01/ef01.jpg', b'img')
+        out = StringIO()
+
+        call_command('dedupe_recipe_images', stdout=out)
+
+        recipe1.refresh_from_db()
+        recipe2.refresh_from_db()
+        digest = hashlib.sha256(b'img').hexdigest()
+        self.assertEqual(
+            recipe1.image.name, sharded_image_path(f'{digest}.jpg')
+        )
+        self.assertEqual(recipe1.image.name, recipe2.image.name)
+        self.assertTrue(default_storage.exists(recipe1.image.name))
+        self.assertFalse(
+            default_storage.exists('uploads/recipe/ab/cd/abcd.jpg')
+        )
+        self.assertFalse(
+            default_storage.exists('uploads/recipe/ef/01/ef01.jpg')
+        )
+        self.assertEqual(
+            ImageBlob.objects.get(name=recipe1.image.name).ref_count, 2
+        )
+        self.assertIn('3 bytes reclaimed', out.getvalue())
+
+    def test_dedupe_recipe_images_recount(self):
+        """Test the recount rebuilds the reference counts"""
+        recipe = self._legacy_recipe('uploads/recipe/ab/cd/abcd.jpg', b'img')
+        call_command('dedupe_recipe_images', stdout=StringIO())
+        recipe.refresh_from_db()
+        ImageBlob.objects.filter(name=recipe.image.name).update(ref_count=7)
+
+        call_command('dedupe_recipe_images', recount=True, stdout=StringIO())
+
+        self.assertEqual(
+            ImageBlob.objects.get(name=recipe.image.name).ref_count, 1
+        )
+
+
+class CollectRecipeImagesCommandTests(TempMediaMixin, TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@rainwalk.io',
+            'testpass'
+        )
+        self.used = 'uploads/recipe/ab/cd/used.jpg'
+        Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=10,
+            price=5.00,
+            image=self.used
+        )
+
+    def _file(self, name, content=b'image', age=2 * 24 * 60 * 60):
+        """Write a file modified age seconds ago"""
+        path = default_storage.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+
+    def test_collect_recipe_images(self):
+        """Test only the files no recipe uses are deleted"""
+        orphan = 'uploads/recipe/ef/01/orphan.jpg'
+        self._file(self.used)
+        self._file(images.rendition_name(self.used, 'thumbnail'))
+        self._file(orphan, b'orphan')
+        self._file(images.rendition_name(orphan, 'thumbnail'), b'thumb')
+        ImageBlob.objects.create(name=orphan, size=6, ref_count=1)
+        out = StringIO()
+
+        call_command('collect_recipe_images', batch_size=2, stdout=out)
+
+        self.assertTrue(default_storage.exists(self.used))
+        self.assertTrue(default_storage.exists(
+            images.rendition_name(self.used, 'thumbnail')
+        ))
+        self.assertFalse(default_storage.exists(orphan))
+        self.assertFalse(default_storage.exists(
+            images.rendition_name(orphan, 'thumbnail')
+        ))
+        self.assertFalse(ImageBlob.objects.filter(name=orphan).exists())
+        self.assertIn('Deleted 2 files, 11 bytes reclaimed', out.getvalue())
+
+    def test_collect_recipe_images_keeps_recent_files(self):
+        """Test files younger than the minimum age are kept"""
+        orphan = 'uploads/recipe/ef/01/orphan.jpg'
+        self._file(orphan, age=60)
+
+        call_command('collect_recipe_images', stdout=StringIO())
+
+        self.assertTrue(default_storage.exists(orphan))
+
+    def test_collect_recipe_images_dry_run(self):
+        """Test the dry run only prints the orphans"""
+        orphan = 'uploads/recipe/ef/01/orphan.jpg'
+        self._file(orphan)
+        out = StringIO()
+
+        call_command('collect_recipe_images', dry_run=True, stdout=out)
+
+        self.assertTrue(default_storage.exists(orphan))
+        self.assertIn(f'Orphan: {orphan}', out.getvalue())
+
+
+class ProcessPendingImagesCommandTests(TempMediaMixin, TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@rainwalk.io',
+            'testpass'
+        )
+
+    def _pending_recipe(self, filename, age):
+        """Create a recipe with an image uploaded age seconds ago"""
+        buffer = io.BytesIO()
+        Image.new('RGB', (10, 10)).save(buffer, format='JPEG')
+        name = default_storage.save(
+            f'uploads/recipe/{filename}', ContentFile(buffer.getvalue())
+        )
+        mtime = time.time() - age
+        os.utime(default_storage.path(name), (mtime, mtime))
+        return Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=10,
+            price=5.00,
+            image=name,
+            image_status=Recipe.IMAGE_PENDING
+        )
+
+    def test_process_pending_images(self):
+        """Test images left pending by a lost job are processed"""
+        stale = self._pending_recipe('stale.jpg', age=60 * 60)
+        recent = self._pending_recipe('recent.jpg', age=0)
+        out = StringIO()
+
+        call_command('process_pending_images', batch_size=1, stdout=out)
+
+        stale.refresh_from_db()
+        recent.refresh_from_db()
+        self.assertEqual(stale.image_status, Recipe.IMAGE_READY)
+        self.assertTrue(default_storage.exists(
+            images.rendition_name(stale.image.name, 'thumbnail')
+        ))
+        self.assertEqual(recent.image_status, Recipe.IMAGE_PENDING)
+        self.assertIn('Processed 1 pending images', out.getvalue())
+
+    def test_process_pending_images_missing_file(self):
+        """Test a pending image whose file is gone is marked failed"""
+        recipe = self._pending_recipe('gone.jpg', age=60 * 60)
+        default_storage.delete(recipe.image.name)
+
+        call_command('process_pending_images', stdout=StringIO())
+
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_status, Recipe.IMAGE_FAILED)
@@ -0,0 +1,171 @@
+from unittest.mock import ANY, patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+from core.tests.utils import EmptyCacheMixin
+
+from recipe import checks, versions
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+TAGS_BULK_URL = reverse('recipe:tag-bulk-upsert')
+
+
+def detail_url(recipe_id):
+    """Return recipe detail URL"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class ConditionalGetTests(EmptyCacheMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@rainwalk.io',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=10,
+            price=5.00
+        )
+        self.recipe.tags.add(self.tag)
+
+    def _revalidate(self, url, res):
+        """Request the URL again with the ETag of the response"""
+        return self.client.get(url, HTTP_IF_NONE_MATCH=res['ETag'])
+
+    def test_not_modified_without_queries(self):
+        """Test a matching ETag is answered without querying the data"""
+        for url in (RECIPES_URL, detail_url(self.recipe.id), TAGS_URL):
+            res = self.client.get(url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+            with self.assertNumQueries(0):
+                res = self._revalidate(url, res)
+
+            self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertIn('ETag', res)
+
+    def test_recipe_change_modifies_list_and_detail(self):
+        """Test saving a recipe gives it a new ETag"""
+        list_res = self.client.get(RECIPES_URL)
+        detail_res = self.client.get(detail_url(self.recipe.id))
+
+        self.recipe.title = 'New title'
+        self.recipe.save()
+
+        res = self._revalidate(RECIPES_URL, list_res)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = self._revalidate(detail_url(self.recipe.id), detail_res)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['title'], 'New title')
+
+    def test_tag_rename_modifies_recipe_detail(self):
+        """Test the detail changes with the names of its tags"""
+        res = self.client.get(detail_url(self.recipe.id))
+
+        self.tag.name = 'Vegetarian'
+        self.tag.save()
+
+        res = self._revalidate(detail_url(self.recipe.id), res)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['tags'][0]['name'], 'Vegetarian')
+
+    def test_recipe_tags_modify_tag_list(self):
+        """Test the tags assigned to recipes depend on the recipes"""
+        url = f'{TAGS_URL}?assigned_only=1'
+        res = self.client.get(url)
+
+        self.recipe.tags.remove(self.tag)
+
+        res = self._revalidate(url, res)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [])
+
+    def test_bulk_upsert_modifies_tag_list(self):
+        """Test the tags inserted in bulk give the list a new ETag"""
+        res = self.client.get(TAGS_URL)
+
+        self.client.post(TAGS_BULK_URL, {'names': ['Dessert']}, format='json')
+
+        res = self._revalidate(TAGS_URL, res)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 2)
+
+    def test_etag_of_other_user(self):
+        """Test the ETag of a user does not match for another one"""
+        res = self.client.get(RECIPES_URL)
+        other = get_user_model().objects.create_user(
+            'other@rainwalk.io',
+            'testpass'
+        )
+        self.client.force_authenticate(other)
+
+        res = self._revalidate(RECIPES_URL, res)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_retrieve_non_numeric_id(self):
+        """Test an id that is not a number is not found, without a version"""
+        res = self.client.get(f'{RECIPES_URL}{"x" * 300}/')
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertIsNone(cache.get(versions.recipe_key('x' * 300)))
+
+    def test_versions_expire(self):
+        """Test the versions are created with a timeout"""
+        with patch('recipe.versions._cache') as version_cache:
+            version_cache.return_value.get_many.return_value = {}
+            versions.get_versions(['version:test'])
+
+        version_cache.return_value.add.assert_called_once_with(
+            'version:test', ANY, timeout=settings.API_VERSION_TIMEOUT
+        )
+
+
+class SharedCacheCheckTests(TestCase):
+
+    LOCAL = {'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }}
+    SHARED = {'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'cache_table',
+    }}
+
+    def test_local_memory_cache_refused(self):
+        """Test ETag versions in the memory of a process are refused"""
+        with override_settings(CACHES=self.LOCAL,
+                               API_CACHE_SINGLE_PROCESS=False):
+            errors = checks.check_shared_caches(None)
+
+        self.assertEqual(
+            [error.id for error in errors],
+            ['recipe.E001'] * len(checks.SHARED_CACHES)
+        )
+
+    def test_shared_cache_accepted(self):
+        """Test a cache shared by the processes passes the check"""
+        with override_settings(CACHES=self.SHARED,
+                               API_CACHE_SINGLE_PROCESS=False):
+            self.assertEqual(checks.check_shared_caches(None), [])
+
+    def test_single_process_accepted(self):
+        """Test a single process may keep the versions in its memory"""
+        with override_settings(CACHES=self.LOCAL,
+                               API_CACHE_SINGLE_PROCESS=True):
+            self.assertEqual(checks.check_shared_caches(None), [])
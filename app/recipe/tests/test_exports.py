@@ -0,0 +1,102 @@
+import csv
+import io
+import json
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+EXPORT_URL = reverse('recipe:recipe-export')
+
+
+class RecipeExportTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@rainwalk.io',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.tags = [
+            Tag.objects.create(user=self.user, name=name)
+            for name in ('Vegan', 'Dessert')
+        ]
+        for i in range(5):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title=f'Recipe, "{i}"',
+                time_minutes=10,
+                price=Decimal('5'),
+            )
+            recipe.tags.add(*self.tags[:i % 3])
+        other = get_user_model().objects.create_user(
+            'other@rainwalk.io',
+            'testpass'
+        )
+        Recipe.objects.create(
+            user=other, title='Other', time_minutes=1, price=Decimal('1')
+        )
+
+    def _content(self, res):
+        return b''.join(res.streaming_content).decode()
+
+    def test_export_ndjson(self):
+        """Test the export has one JSON recipe per line, like the list"""
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        self.assertIn('recipes.ndjson', res['Content-Disposition'])
+        lines = self._content(res).splitlines()
+        listed = self.client.get(RECIPES_URL).data['results']
+        self.assertEqual(
+            [json.loads(line) for line in lines],
+            list(reversed(listed))
+        )
+
+    def test_export_csv(self):
+        """Test the export as CSV with the ids of the tags in one cell"""
+        res = self.client.get(EXPORT_URL, {'fmt': 'csv'})
+
+        self.assertEqual(res['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.reader(io.StringIO(self._content(res))))
+        self.assertEqual(rows[0], [
+            'id', 'title', 'ingredients', 'tags', 'time_minutes', 'price',
+            'link'
+        ])
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[1][1], 'Recipe, "0"')
+        self.assertEqual(rows[3][3], f'{self.tags[0].id} {self.tags[1].id}')
+        self.assertEqual(rows[3][5], '5.00')
+
+    @override_settings(RECIPE_EXPORT_CHUNK_SIZE=2)
+    def test_export_reads_chunks(self):
+        """Test the relations are read once per chunk of recipes"""
+        res = self.client.get(EXPORT_URL)
+
+        # One query for the rows, two relations for each of the 3 chunks
+        with self.assertNumQueries(7):
+            content = self._content(res)
+
+        self.assertEqual(len(content.splitlines()), 5)
+
+    def test_export_filters(self):
+        """Test the filters of the list apply to the export"""
+        res = self.client.get(EXPORT_URL, {'tags': self.tags[1].id})
+
+        self.assertEqual(len(self._content(res).splitlines()), 1)
+
+    def test_export_invalid_format(self):
+        """Test unknown formats are refused"""
+        res = self.client.get(EXPORT_URL, {'fmt': 'xml'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
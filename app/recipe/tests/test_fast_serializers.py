@@ -0,0 +1,94 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from rest_framework.renderers import JSONRenderer
+
+from core.models import Ingredient, Recipe, Tag
+
+from recipe.fast_serializers import FastListSerializer
+from recipe.serializers import IngredientSerializer, RecipeSerializer, \
+                               TagSerializer
+
+
+def render(data):
+    """Return the JSON bytes of the data"""
+    return JSONRenderer().render(data)
+
+
+class FastListSerializerTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@rainwalk.io',
+            'testpass'
+        )
+        self.tags = [
+            Tag.objects.create(user=self.user, name=name)
+            for name in ('Vegan', 'Dessert', 'Quick')
+        ]
+        self.ingredient = Ingredient.objects.create(
+            user=self.user, name='Salt'
+        )
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Toast',
+            time_minutes=5,
+            price=Decimal('3')
+        )
+        self.recipe.tags.add(*self.tags)
+        self.recipe.ingredients.add(self.ingredient)
+        Recipe.objects.create(
+            user=self.user,
+            title='Soup',
+            time_minutes=30,
+            price=Decimal('10.50'),
+            link='https://rainwalk.io/soup'
+        )
+
+    def _assert_same_output(self, serializer_class, queryset):
+        fast = FastListSerializer(serializer_class)
+
+        data = fast.to_representation(fast.values(queryset))
+
+        self.assertEqual(
+            render(data),
+            render(serializer_class(queryset, many=True).data)
+        )
+
+    def test_recipes_same_output(self):
+        """Test the recipes are serialized byte for byte the same"""
+        self._assert_same_output(
+            RecipeSerializer,
+            Recipe.objects.order_by('-id')
+        )
+
+    def test_tags_and_ingredients_same_output(self):
+        """Test the tags and ingredients are serialized the same"""
+        self._assert_same_output(TagSerializer, Tag.objects.order_by('-name'))
+        self._assert_same_output(
+            IngredientSerializer,
+            Ingredient.objects.order_by('-name')
+        )
+
+    def test_empty_list(self):
+        """Test an empty list does not query the relations"""
+        fast = FastListSerializer(RecipeSerializer)
+
+        with self.assertNumQueries(1):
+            data = fast.to_representation(
+                fast.values(Recipe.objects.filter(pk=0))
+            )
+
+        self.assertEqual(data, [])
+
+    def test_recipes_query_count(self):
+        """Test the relations are read with one query each"""
+        fast = FastListSerializer(RecipeSerializer)
+
+        with self.assertNumQueries(3):
+            data = fast.to_representation(fast.values(Recipe.objects.all()))
+
+        self.assertEqual(data[0]['tags'], [tag.id for tag in self.tags])
+        self.assertEqual(data[0]['price'], '3.00')
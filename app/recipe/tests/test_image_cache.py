@@ -0,0 +1,278 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from core.tests.utils import TempMediaMixin
+
+from recipe.image_cache import SIZE_FILE, ImageCache, image_cache
+
+
+CACHE_ROOT = tempfile.mkdtemp()
+
+
+def resized_image_url(recipe_id):
+    """Return URL for the resized recipe image"""
+    return reverse('recipe:recipe-resized-image', args=[recipe_id])
+
+
+def image_content(size=(640, 480), mode='RGB'):
+    """Return a JPEG image as a file for the storage"""
+    f = ContentFile(b'')
+    Image.new(mode, size, 'red').save(f, format='JPEG')
+    return f
+
+
+@override_settings(IMAGE_CACHE_ROOT=CACHE_ROOT)
+class ResizedImageApiTests(TempMediaMixin, TestCase):
+    """Test resizing recipe images on demand"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(CACHE_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@rainwalk.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=10,
+            price=5.00
+        )
+        self.recipe.image.save('image.jpg', image_content())
+
+    def tearDown(self):
+        image_cache.clear()
+        super().tearDown()
+
+    def test_resize_image(self):
+        """Test the image is returned with the requested width and format"""
+        res = self.client.get(
+            resized_image_url(self.recipe.id),
+            {'w': 320, 'fmt': 'webp'}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'image/webp')
+        with tempfile.TemporaryFile() as f:
+            f.write(b''.join(res.streaming_content))
+            img = Image.open(f)
+            self.assertEqual(img.format, 'WEBP')
+            self.assertEqual(img.size, (320, 240))
+
+    def test_resize_image_cached(self):
+        """Test the second request is served from the cache"""
+        url = resized_image_url(self.recipe.id)
+        self.client.get(url, {'w': 100})
+
+        with patch.object(ImageCache, '_create') as create:
+            res = self.client.get(url, {'w': 100})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        create.assert_not_called()
+
+    def test_resize_never_enlarges(self):
+        """Test a width bigger than the image keeps the original size"""
+        res = self.client.get(resized_image_url(self.recipe.id), {'w': 2000})
+
+        with tempfile.TemporaryFile() as f:
+            f.write(b''.join(res.streaming_content))
+            self.assertEqual(Image.open(f).size, (640, 480))
+
+    def test_resize_evicted_before_served(self):
+        """Test an image evicted by another process is resized again"""
+        get_path = image_cache.get_path
+        calls = []
+
+        def evicted_get_path(*args):
+            path = get_path(*args)
+            calls.append(path)
+            if len(calls) == 1:
+                os.remove(path)
+            return path
+
+        with patch.object(image_cache, 'get_path', evicted_get_path):
+            res = self.client.get(resized_image_url(self.recipe.id),
+                                  {'w': 100})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(calls), 2)
+
+    def test_resize_cmyk_to_png(self):
+        """Test a CMYK image is converted for the formats without CMYK"""
+        self.recipe.image.save('cmyk.jpg', image_content(mode='CMYK'))
+
+        res = self.client.get(resized_image_url(self.recipe.id),
+                              {'w': 100, 'fmt': 'png'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        with tempfile.TemporaryFile() as f:
+            f.write(b''.join(res.streaming_content))
+            self.assertEqual(Image.open(f).mode, 'RGB')
+
+    def test_resize_missing_original(self):
+        """Test an image file missing from the storage returns 404"""
+        self.recipe.image.storage.delete(self.recipe.image.name)
+
+        res = self.client.get(resized_image_url(self.recipe.id), {'w': 100})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_resize_invalid_params(self):
+        """Test an invalid width or format is rejected"""
+        url = resized_image_url(self.recipe.id)
+
+        res = self.client.get(url, {'w': 'big'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        res = self.client.get(url, {'w': 100, 'fmt': 'bmp'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_resize_without_image(self):
+        """Test a recipe without image returns 404"""
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='No image',
+            time_minutes=10,
+            price=5.00
+        )
+
+        res = self.client.get(
+            resized_image_url(recipe.id),
+            {'w': 100},
+            HTTP_ACCEPT='image/webp'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ImageCacheTests(TestCase):
+    """Test the on disk cache of resized images"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.override = override_settings(IMAGE_CACHE_ROOT=self.root)
+        self.override.enable()
+        self.cache = ImageCache()
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.root)
+
+    def _fake_create(self, size, cache=None):
+        """Return a _create replacement that writes size bytes"""
+        cache = cache or self.cache
+
+        def create(image_name, width, fmt, path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(b'x' * size)
+            cache._added(size)
+        return create
+
+    def test_least_recently_used_evicted(self):
+        """Test the oldest files are removed when the cache is full"""
+        self.cache._create = self._fake_create(400)
+        with override_settings(IMAGE_CACHE_MAX_BYTES=1000):
+            first = self.cache.get_path('a.jpg', 100, 'jpeg')
+            second = self.cache.get_path('b.jpg', 100, 'jpeg')
+            os.utime(first, (1, 1))
+            os.utime(second, (2, 2))
+            # Reading the first one makes the second the least recent
+            self.cache.get_path('a.jpg', 100, 'jpeg')
+            third = self.cache.get_path('c.jpg', 100, 'jpeg')
+
+        self.assertTrue(os.path.exists(first))
+        self.assertFalse(os.path.exists(second))
+        self.assertTrue(os.path.exists(third))
+
+    def test_size_shared_by_processes(self):
+        """Test the writes of every process count towards the limit"""
+        # Two processes with their own cache object on the same directory
+        other = ImageCache()
+        self.cache._create = self._fake_create(400)
+        other._create = self._fake_create(400, other)
+        with override_settings(IMAGE_CACHE_MAX_BYTES=1000):
+            first = self.cache.get_path('a.jpg', 100, 'jpeg')
+            os.utime(first, (1, 1))
+            other.get_path('b.jpg', 100, 'jpeg')
+            self.cache.get_path('c.jpg', 100, 'jpeg')
+
+        self.assertFalse(os.path.exists(first))
+        self.assertEqual(
+            sum(entry.stat().st_size for entry in self.cache._scan()), 800
+        )
+
+    def test_concurrent_requests_create_once(self):
+        """Test requests for the same image wait for one resize"""
+        calls = []
+        create = self._fake_create(10)
+
+        def slow_create(*args):
+            calls.append(args)
+            time.sleep(0.05)
+            create(*args)
+
+        self.cache._create = slow_create
+        threads = [
+            threading.Thread(
+                target=self.cache.get_path,
+                args=('a.jpg', 100, 'jpeg')
+            )
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+
+    def test_processes_create_once(self):
+        """Test processes asking for the same image wait for one resize"""
+        calls = []
+        # One cache object per process, on the same directory
+        caches = [ImageCache() for _ in range(5)]
+        for cache in caches:
+            create = self._fake_create(10, cache)
+
+            def slow_create(*args, create=create):
+                calls.append(args)
+                time.sleep(0.05)
+                create(*args)
+
+            cache._create = slow_create
+        threads = [
+            threading.Thread(
+                target=cache.get_path,
+                args=('a.jpg', 100, 'jpeg')
+            )
+            for cache in caches
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        # The file is counted once in the total shared by the processes
+        with open(os.path.join(self.root, SIZE_FILE)) as f:
+            self.assertEqual(f.read(), '10')
@@ -0,0 +1,227 @@
+import json
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+
+from core.models import ImportCheckpoint, Recipe, Tag
+
+from recipe import imports, versions
+
+
+class ImportRecipesTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.user = get_user_model().objects.create_user(
+            'test@rainwalk.io',
+            'testpass'
+        )
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, name, content):
+        """Write an input file and return its path"""
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def _ndjson(self, recipes):
+        return ''.join(json.dumps(recipe) + '\n' for recipe in recipes)
+
+    def _import(self, path, **options):
+        out = StringIO()
+        call_command('import_recipes', path, stdout=out, **options)
+        return out.getvalue()
+
+    def test_import_ndjson(self):
+        """Test recipes are imported with their users, tags and ingredients"""
+        path = self._write('recipes.ndjson', self._ndjson([
+            {'user': 'test@rainwalk.io', 'title': 'Kale salad',
+             'time_minutes': 5, 'price': '4.50',
+             'tags': ['Vegan', 'Quick'], 'ingredients': ['Kale']},
+            {'user': 'new@RAINWALK.IO', 'title': 'Soup', 'time_minutes': 30,
+             'price': 7, 'link': 'https://rainwalk.io/soup',
+             'tags': ['Vegan'], 'ingredients': []},
+        ]))
+
+        out = self._import(path, batch_size=1)
+
+        self.assertIn('Imported 2 recipes', out)
+        recipe = Recipe.objects.get(user=self.user)
+        self.assertEqual(recipe.title, 'Kale salad')
+        self.assertEqual(recipe.price, Decimal('4.50'))
+        # The existing tag is used, the new names are created
+        self.assertEqual(
+            sorted(recipe.tags.values_list('name', flat=True)),
+            ['Quick', 'Vegan']
+        )
+        self.assertIn(self.tag, recipe.tags.all())
+        self.assertEqual(
+            list(recipe.ingredients.values_list('name', flat=True)), ['Kale']
+        )
+        new_user = get_user_model().objects.get(email='new@rainwalk.io')
+        self.assertFalse(new_user.has_usable_password())
+        soup = Recipe.objects.get(user=new_user)
+        self.assertEqual(soup.link, 'https://rainwalk.io/soup')
+        self.assertEqual(
+            list(soup.tags.values_list('name', flat=True)), ['Vegan']
+        )
+        self.assertEqual(Tag.objects.filter(name='Vegan').count(), 2)
+
+    def test_import_csv(self):
+        """Test a CSV input has the names joined in one cell"""
+        path = self._write(
+            'recipes.csv',
+            'user,title,time_minutes,price,link,tags,ingredients\n'
+            'test@rainwalk.io,"Pie, apple",60,12.00,,Vegan|Dessert,Apple\n'
+        )
+
+        self._import(path)
+
+        recipe = Recipe.objects.get(user=self.user)
+        self.assertEqual(recipe.title, 'Pie, apple')
+        self.assertEqual(
+            sorted(recipe.tags.values_list('name', flat=True)),
+            ['Dessert', 'Vegan']
+        )
+
+    def test_import_bumps_versions(self):
+        """Test the cached lists of the users are not served any more"""
+        keys = [
+            versions.user_key(self.user.pk, kind)
+            for kind in (versions.RECIPES, versions.TAGS)
+        ]
+        before = versions.get_versions(keys)
+        path = self._write('recipes.ndjson', self._ndjson([
+            {'user': 'test@rainwalk.io', 'title': 'Soup', 'time_minutes': 30,
+             'price': 7, 'tags': ['Hot']},
+        ]))
+
+        self._import(path)
+
+        after = versions.get_versions(keys)
+        self.assertNotEqual(before[0], after[0])
+        self.assertNotEqual(before[1], after[1])
+
+    def test_import_batch_returns_users(self):
+        """Test a batch leaves the versions to the process of the command"""
+        record = imports.clean(1, {
+            'user': 'test@rainwalk.io', 'title': 'Soup', 'time_minutes': 30,
+            'price': 7,
+        })
+
+        with patch('recipe.versions.bump_user') as bump_user:
+            result = imports.import_batch('test', 0, 1, [record])
+
+        bump_user.assert_not_called()
+        self.assertEqual(result, (0, 1, 1, [self.user.pk]))
+
+    def test_import_resumes(self):
+        """Test an import that failed goes on from its checkpoint"""
+        recipes = [
+            {'user': 'test@rainwalk.io', 'title': f'Recipe {i}',
+             'time_minutes': 5, 'price': 1}
+            for i in range(5)
+        ]
+        recipes[3]['price'] = 'free'
+        path = self._write('recipes.ndjson', self._ndjson(recipes))
+
+        with self.assertRaisesMessage(CommandError, 'Line 4: price'):
+            self._import(path, batch_size=2)
+        # The batches before the invalid line were committed
+        self.assertEqual(Recipe.objects.count(), 2)
+
+        recipes[3]['price'] = 2
+        self._write('recipes.ndjson', self._ndjson(recipes))
+        out = self._import(path, batch_size=2)
+
+        self.assertIn('skipped 2', out)
+        self.assertEqual(
+            sorted(Recipe.objects.values_list('title', flat=True)),
+            [f'Recipe {i}' for i in range(5)]
+        )
+
+    def test_import_done_and_reset(self):
+        """Test a finished import is not imported twice unless reset"""
+        path = self._write('recipes.ndjson', self._ndjson([
+            {'user': 'test@rainwalk.io', 'title': 'Soup', 'time_minutes': 30,
+             'price': 7},
+        ]))
+        self._import(path)
+
+        self._import(path)
+        self.assertEqual(Recipe.objects.count(), 1)
+
+        self._import(path, reset=True)
+        self.assertEqual(Recipe.objects.count(), 2)
+
+    def test_import_invalid_user(self):
+        """Test a recipe without the email of its user is refused"""
+        path = self._write('recipes.ndjson', self._ndjson([
+            {'user': 'nobody', 'title': 'Soup', 'time_minutes': 30,
+             'price': 7},
+        ]))
+
+        with self.assertRaisesMessage(CommandError, 'Line 1: user'):
+            self._import(path)
+        self.assertFalse(Recipe.objects.exists())
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Needs COPY of PostgreSQL')
+class PostgresImportRecipesTests(ImportRecipesTests):
+    """The tests of the import, through the COPY and set-based SQL path"""
+
+    def setUp(self):
+        super().setUp()
+        patcher = patch(
+            'recipe.imports._orm_batch',
+            side_effect=AssertionError('The COPY path must be used')
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_import_duplicate_names(self):
+        """Test names repeated in a batch are created once per user"""
+        recipes = [
+            {'user': email, 'title': f'Recipe {i}', 'time_minutes': 5,
+             'price': 1, 'tags': ['Vegan', 'Quick', 'Vegan'],
+             'ingredients': ['Kale']}
+            for i, email in enumerate(
+                ['test@rainwalk.io', 'new@rainwalk.io'] * 2
+            )
+        ]
+        path = self._write('recipes.ndjson', self._ndjson(recipes))
+
+        self._import(path, batch_size=2)
+
+        new_user = get_user_model().objects.get(email='new@rainwalk.io')
+        for user in (self.user, new_user):
+            self.assertEqual(
+                sorted(Tag.objects.filter(user=user).values_list(
+                    'name', flat=True
+                )),
+                ['Quick', 'Vegan']
+            )
+            for recipe in Recipe.objects.filter(user=user):
+                self.assertEqual(recipe.tags.count(), 2)
+                self.assertEqual(recipe.ingredients.count(), 1)
+        # The existing tag was used, not created again
+        self.assertIn(self.tag, Recipe.objects.filter(
+            user=self.user
+        ).first().tags.all())
+        self.assertEqual(
+            ImportCheckpoint.objects.get(name='recipes.ndjson').line, 4
+        )
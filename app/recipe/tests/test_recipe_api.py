@@ -1,23 +1,33 @@
 # Allows us to create a demy file
 import tempfile
 import os
+from unittest.mock import patch
 
 # The pillow requiremnt
 from PIL import Image
 
 from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Recipe, Tag, Ingredient
+from core.models import ImageBlob, Recipe, Tag, Ingredient
+from core.tests.utils import EmptyCacheMixin
 
-from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
+from recipe import images, metrics
+from recipe.views import RecipeViewSet
+from recipe.serializers import RecipeSerializer, RecipeDetailSerializer, \
+                               RecipeImageSerializer
 
 
 RECIPES_URL = reverse('recipe:recipe-list')
+BULK_URL = reverse('recipe:recipe-bulk-create')
 
 
 def image_upload_url(recipe_id):
@@ -67,10 +77,11 @@ class PublicRecipeApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateRecipeApiTests(TestCase):
+class PrivateRecipeApiTests(EmptyCacheMixin, TestCase):
     """Test authenticated recipe API access"""
 
     def setUp(self):
+        super().setUp()
         self.client = APIClient()
         self.user = get_user_model().objects.create_user(
             'test@rainwalk.io',
@@ -89,7 +100,7 @@ class PrivateRecipeApiTests(TestCase):
         serializer = RecipeSerializer(recipes, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_recipes_limited_to_user(self):
         """Test retrieving recipes for user"""
@@ -106,8 +117,8 @@ class PrivateRecipeApiTests(TestCase):
         serializer = RecipeSerializer(recipes, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_view_recipe_detail(self):
         """Test viewing a recipe detail"""
@@ -122,6 +133,72 @@ class PrivateRecipeApiTests(TestCase):
 
         self.assertEqual(res.data, serializer.data)
 
+    def test_list_recipes_query_count_is_constant(self):
+        """Test listing recipes does not run a query per recipe"""
+        for i in range(5):
+            recipe = sample_recipe(user=self.user, title=f'Recipe {i}')
+            recipe.tags.add(sample_tag(user=self.user, name=f'Tag {i}'))
+            recipe.ingredients.add(
+                sample_ingredient(user=self.user, name=f'Ingredient {i}')
+            )
+
+        # One query for the recipes and one for each many to many relation
+        with self.assertNumQueries(3):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 5)
+
+    def test_view_recipe_detail_query_count(self):
+        """Test viewing a recipe detail prefetches tags and ingredients"""
+        recipe = sample_recipe(user=self.user)
+        recipe.tags.add(sample_tag(user=self.user))
+        recipe.tags.add(sample_tag(user=self.user, name='Vegan'))
+        recipe.ingredients.add(sample_ingredient(user=self.user))
+
+        with self.assertNumQueries(3):
+            res = self.client.get(detail_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['tags']), 2)
+
+    def test_view_recipe_detail_cached(self):
+        """Test the rendered detail is returned from the cache"""
+        recipe = sample_recipe(user=self.user)
+        recipe.tags.add(sample_tag(user=self.user))
+        url = detail_url(recipe.id)
+
+        res = self.client.get(url)
+        self.assertEqual(res['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            cached = self.client.get(url)
+
+        self.assertEqual(cached['X-Cache'], 'HIT')
+        self.assertEqual(cached.content, res.content)
+        self.assertEqual(cached['Content-Type'], 'application/json')
+        self.assertEqual(
+            metrics.get_counts()['recipe-detail'], {'hit': 1, 'miss': 1}
+        )
+
+    def test_recipe_detail_cache_follows_tag_names(self):
+        """Test renaming a tag only renders the recipes using it again"""
+        tag = sample_tag(user=self.user)
+        recipe = sample_recipe(user=self.user)
+        recipe.tags.add(tag)
+        other = sample_recipe(user=self.user, title='Other')
+        self.client.get(detail_url(recipe.id))
+        self.client.get(detail_url(other.id))
+
+        tag.name = 'Dessert'
+        tag.save()
+        sample_tag(user=self.user, name='Unused')
+
+        res = self.client.get(detail_url(recipe.id))
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['tags'][0]['name'], 'Dessert')
+        self.assertEqual(self.client.get(detail_url(other.id))['X-Cache'],
+                         'HIT')
+
     def test_create_basic_recipe(self):
         """Test creating recipe"""
         payload = {
@@ -218,6 +295,231 @@ class PrivateRecipeApiTests(TestCase):
         tags = recipe.tags.all()
         self.assertEqual(len(tags), 0)
 
+    def test_recipes_paginated_with_cursor(self):
+        """Test the recipes list is split into cursor pages"""
+        recipes = [
+            sample_recipe(user=self.user, title=f'Recipe {i}')
+            for i in range(5)
+        ]
+
+        res = self.client.get(RECIPES_URL, {'page_size': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        # Newest recipes first
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data['results']],
+            [recipes[4].id, recipes[3].id]
+        )
+        self.assertIsNone(res.data['previous'])
+        self.assertIn('cursor=', res.data['next'])
+
+        res = self.client.get(res.data['next'])
+
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data['results']],
+            [recipes[2].id, recipes[1].id]
+        )
+        self.assertIsNotNone(res.data['previous'])
+
+    def test_recipes_pagination_keeps_filters(self):
+        """Test the next page cursor keeps the tags filter"""
+        tag = sample_tag(user=self.user, name='Vegan')
+        for i in range(3):
+            sample_recipe(user=self.user, title=f'Vegan {i}').tags.add(tag)
+        sample_recipe(user=self.user, title='Steak')
+
+        res = self.client.get(RECIPES_URL, {'tags': tag.id, 'page_size': 2})
+        res = self.client.get(res.data['next'])
+
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['title'], 'Vegan 0')
+        self.assertIsNone(res.data['next'])
+
+    def test_filter_recipes_by_tags_match_any_is_unique(self):
+        """Test a recipe with several of the tags is returned once"""
+        recipe = sample_recipe(user=self.user)
+        tag1 = sample_tag(user=self.user, name='Vegan')
+        tag2 = sample_tag(user=self.user, name='Dessert')
+        recipe.tags.add(tag1, tag2)
+
+        res = self.client.get(RECIPES_URL, {'tags': f'{tag1.id},{tag2.id}'})
+
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_filter_recipes_by_tags_match_all(self):
+        """Test returning only recipes that have all the given tags"""
+        recipe1 = sample_recipe(user=self.user, title='Vegan brownies')
+        recipe2 = sample_recipe(user=self.user, title='Vegan curry')
+        tag1 = sample_tag(user=self.user, name='Vegan')
+        tag2 = sample_tag(user=self.user, name='Dessert')
+        recipe1.tags.add(tag1, tag2)
+        recipe2.tags.add(tag1)
+
+        res = self.client.get(
+            RECIPES_URL,
+            {'tags': f'{tag1.id},{tag2.id},{tag2.id}', 'match': 'all'}
+        )
+
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data['results']],
+            [recipe1.id]
+        )
+
+    def test_filter_recipes_match_all_tags_and_ingredients(self):
+        """Test match all applies to both tags and ingredients"""
+        recipe1 = sample_recipe(user=self.user, title='Tofu curry')
+        recipe2 = sample_recipe(user=self.user, title='Tofu salad')
+        tag = sample_tag(user=self.user, name='Vegan')
+        ingredient1 = sample_ingredient(user=self.user, name='Tofu')
+        ingredient2 = sample_ingredient(user=self.user, name='Curry paste')
+        recipe1.tags.add(tag)
+        recipe1.ingredients.add(ingredient1, ingredient2)
+        recipe2.tags.add(tag)
+        recipe2.ingredients.add(ingredient1)
+
+        res = self.client.get(RECIPES_URL, {
+            'tags': f'{tag.id}',
+            'ingredients': f'{ingredient1.id},{ingredient2.id}',
+            'match': 'all',
+        })
+
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data['results']],
+            [recipe1.id]
+        )
+
+    def test_filter_recipes_invalid_match(self):
+        """Test an unknown match mode is rejected"""
+        res = self.client.get(RECIPES_URL, {'tags': '1', 'match': 'some'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_exclude_recipes_by_ingredients(self):
+        """Test recipes with an excluded ingredient are not returned"""
+        recipe1 = sample_recipe(user=self.user, title='Peanut noodles')
+        recipe2 = sample_recipe(user=self.user, title='Plain noodles')
+        recipe3 = sample_recipe(user=self.user, title='Prawn noodles')
+        peanut = sample_ingredient(user=self.user, name='Peanut')
+        prawn = sample_ingredient(user=self.user, name='Prawn')
+        noodles = sample_ingredient(user=self.user, name='Noodles')
+        recipe1.ingredients.add(peanut, noodles)
+        recipe2.ingredients.add(noodles)
+        recipe3.ingredients.add(prawn, noodles)
+
+        res = self.client.get(
+            RECIPES_URL,
+            {'exclude_ingredients': f'{peanut.id},{prawn.id}'}
+        )
+
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data['results']],
+            [recipe2.id]
+        )
+
+    def test_exclude_tags_combined_with_filter(self):
+        """Test excluded tags combine with the inclusion filters"""
+        recipe1 = sample_recipe(user=self.user, title='Vegan curry')
+        recipe2 = sample_recipe(user=self.user, title='Spicy vegan curry')
+        recipe3 = sample_recipe(user=self.user, title='Untagged curry')
+        vegan = sample_tag(user=self.user, name='Vegan')
+        spicy = sample_tag(user=self.user, name='Spicy')
+        curry = sample_ingredient(user=self.user, name='Curry paste')
+        recipe1.tags.add(vegan)
+        recipe2.tags.add(vegan, spicy)
+        for recipe in (recipe1, recipe2, recipe3):
+            recipe.ingredients.add(curry)
+
+        res = self.client.get(RECIPES_URL, {
+            'tags': f'{vegan.id}',
+            'ingredients': f'{curry.id}',
+            'exclude_tags': f'{spicy.id}',
+        })
+
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data['results']],
+            [recipe1.id]
+        )
+
+    def test_bulk_create_recipes(self):
+        """Test creating a list of recipes in one request"""
+        tag = sample_tag(user=self.user, name='Vegan')
+        ingredient = sample_ingredient(user=self.user, name='Tofu')
+        payload = [
+            {
+                'title': 'Tofu curry',
+                'time_minutes': 30,
+                'price': '7.00',
+                'tags': [tag.id],
+                'ingredients': [ingredient.id],
+            },
+            {'title': 'Plain rice', 'time_minutes': 15, 'price': '1.00'},
+        ]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data), 2)
+        recipe = Recipe.objects.get(id=res.data[0]['id'])
+        self.assertEqual(recipe.user, self.user)
+        self.assertEqual(list(recipe.tags.all()), [tag])
+        self.assertEqual(list(recipe.ingredients.all()), [ingredient])
+        self.assertEqual(res.data[0], RecipeSerializer(recipe).data)
+
+    def test_bulk_create_query_count_is_constant(self):
+        """Test the number of queries does not grow with the recipes"""
+        tags = [sample_tag(user=self.user, name=f'Tag {i}') for i in range(3)]
+        payload = [
+            {
+                'title': f'Recipe {i}',
+                'time_minutes': 10,
+                'price': '5.00',
+                'tags': [tag.id for tag in tags],
+            }
+            for i in range(20)
+        ]
+
+        res = self.client.post(BULK_URL, payload[:2], format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        with CaptureQueriesContext(connection) as small:
+            self.client.post(BULK_URL, payload[:2], format='json')
+        with CaptureQueriesContext(connection) as large:
+            self.client.post(BULK_URL, payload, format='json')
+
+        if connection.features.can_return_rows_from_bulk_insert:
+            self.assertEqual(len(small), len(large))
+        self.assertEqual(Recipe.objects.count(), 24)
+
+    def test_bulk_create_reports_errors_per_item(self):
+        """Test invalid ids are reported on their item and nothing is saved"""
+        user2 = get_user_model().objects.create_user(
+            'other@rainwalk.io',
+            'password123',
+        )
+        tag = sample_tag(user=self.user, name='Vegan')
+        other_tag = sample_tag(user=user2, name='Vegan')
+        payload = [
+            {
+                'title': 'Tofu curry',
+                'time_minutes': 30,
+                'price': '7.00',
+                'tags': [tag.id],
+            },
+            {
+                'title': 'Fish curry',
+                'time_minutes': 30,
+                'price': '9.00',
+                'tags': [other_tag.id],
+            },
+        ]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('tags', res.data[1])
+        self.assertFalse(Recipe.objects.exists())
+
 
 class RecipeImageUploadTest(TestCase):
 
@@ -233,8 +535,22 @@ class RecipeImageUploadTest(TestCase):
     # This function will run at the end of the test
     def tearDown(self):
         """Delete the image at the end of the test"""
+        self.recipe.refresh_from_db()
+        if self.recipe.image:
+            for rendition in images.RENDITIONS:
+                default_storage.delete(
+                    images.rendition_name(self.recipe.image.name, rendition)
+                )
         self.recipe.image.delete()
 
+    def _upload(self, img, **save_kwargs):
+        """Upload the PIL image to the recipe"""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            img.save(ntf, format='JPEG', **save_kwargs)
+            ntf.seek(0)
+            return self.client.post(url, {'image': ntf}, format='multipart')
+
     def test_upload_image_to_recipe(self):
         """Test uploading an image to recipe"""
         url = image_upload_url(self.recipe.id)
@@ -251,6 +567,72 @@ class RecipeImageUploadTest(TestCase):
         self.assertIn('image', res.data)
         self.assertTrue(os.path.exists(self.recipe.image.path))
 
+    def test_upload_image_processed_in_background(self):
+        """Test the upload answers before the renditions exist"""
+        res = self._upload(Image.new('RGB', (10, 10)))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['image_status'], Recipe.IMAGE_PENDING)
+        self.assertEqual(res.data['renditions'], {})
+
+    def test_upload_image_releases_current_image(self):
+        """Test the image released is the one of the row, not a stale one"""
+        other = sample_recipe(user=self.user)
+        for recipe in (self.recipe, other):
+            recipe.image.save('a.jpg', ContentFile(b'shared'))
+            images.replace_image(recipe, None)
+        shared = self.recipe.image.name
+        stale = Recipe.objects.get(pk=self.recipe.pk)
+        # Another upload to the recipe committed after get_object()
+        self.recipe.image.save('b.jpg', ContentFile(b'replaced'))
+        images.replace_image(self.recipe, shared)
+        replaced = self.recipe.image.name
+        self.addCleanup(default_storage.delete, shared)
+        self.addCleanup(default_storage.delete, replaced)
+
+        with patch.object(RecipeViewSet, 'get_object', return_value=stale):
+            res = self._upload(Image.new('RGB', (10, 10)))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(ImageBlob.objects.get(name=shared).ref_count, 1)
+        self.assertFalse(ImageBlob.objects.filter(name=replaced).exists())
+
+    def test_create_renditions(self):
+        """Test the renditions are bounded, rotated and without EXIF"""
+        exif = Image.Exif()
+        # Orientation: rotate 90 degrees to display
+        exif[0x0112] = 6
+        self._upload(Image.new('RGB', (2000, 1000)), exif=exif.tobytes())
+        self.recipe.refresh_from_db()
+
+        images.create_renditions(self.recipe.id, self.recipe.image.name)
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_READY)
+        for rendition, size in images.RENDITIONS.items():
+            name = images.rendition_name(self.recipe.image.name, rendition)
+            with default_storage.open(name) as f:
+                img = Image.open(f)
+                self.assertEqual(img.format, 'JPEG')
+                self.assertEqual(img.size, (size // 2, size))
+                self.assertNotIn('exif', img.info)
+
+        serializer = RecipeImageSerializer(self.recipe)
+        self.assertEqual(
+            set(serializer.data['renditions']),
+            set(images.RENDITIONS)
+        )
+
+    def test_create_renditions_failed(self):
+        """Test an image that can not be decoded is marked as failed"""
+        self.recipe.image.save('broken.jpg', ContentFile(b'not an image'))
+
+        with self.assertLogs('recipe.images', 'ERROR'):
+            images.create_renditions(self.recipe.id, self.recipe.image.name)
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_FAILED)
+
     def test_upload_url(self):
         """Test uploading an invalid image"""
         url = image_upload_url(self.recipe.id)
@@ -277,9 +659,9 @@ class RecipeImageUploadTest(TestCase):
         serializer2 = RecipeSerializer(recipe2)
         serializer3 = RecipeSerializer(recipe3)
 
-        self.assertIn(serializer1.data, res.data)
-        self.assertIn(serializer2.data, res.data)
-        self.assertNotIn(serializer3.data, res.data)
+        self.assertIn(serializer1.data, res.data['results'])
+        self.assertIn(serializer2.data, res.data['results'])
+        self.assertNotIn(serializer3.data, res.data['results'])
 
     def test_filter_recipes_by_ingredients(self):
         """Test returning recipes with specific ingredients"""
@@ -300,6 +682,6 @@ class RecipeImageUploadTest(TestCase):
         serializer2 = RecipeSerializer(recipe2)
         serializer3 = RecipeSerializer(recipe3)
 
-        self.assertIn(serializer1.data, res.data)
-        self.assertIn(serializer2.data, res.data)
-        self.assertNotIn(serializer3.data, res.data)
+        self.assertIn(serializer1.data, res.data['results'])
+        self.assertIn(serializer2.data, res.data['results'])
+        self.assertNotIn(serializer3.data, res.data['results'])
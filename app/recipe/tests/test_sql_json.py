@@ -0,0 +1,144 @@
+import json
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from core.tests.utils import EmptyCacheMixin
+
+from recipe import serializers, sql_json
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def detail_url(recipe_id):
+    """Return recipe detail URL"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class SqlJsonTests(EmptyCacheMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@rainwalk.io',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        tags = [
+            Tag.objects.create(user=self.user, name=name)
+            for name in ('Végétarien', 'Dessert')
+        ]
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Crème brûlée',
+            time_minutes=45,
+            price=Decimal('7.5'),
+            link='https://rainwalk.io/"creme"'
+        )
+        self.recipe.tags.add(*tags)
+        self.recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Sugar')
+        )
+        for i in range(3):
+            Recipe.objects.create(
+                user=self.user,
+                title=f'Recipe {i}',
+                time_minutes=10,
+                price=Decimal('10'),
+            )
+
+    def _compare(self, url):
+        """Return the response built by the serializers and by the SQL"""
+        expected = self.client.get(url)
+        cache.clear()
+        with override_settings(RECIPE_SQL_JSON=True):
+            res = self.client.get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/json')
+        self.assertEqual(
+            json.loads(res.content),
+            json.loads(expected.content)
+        )
+        return res
+
+    def test_list_same_as_serializer(self):
+        """Test the list built by the database matches the serializers"""
+        self._compare(RECIPES_URL)
+
+    def test_list_pages_same_as_serializer(self):
+        """Test the pages and their links are the same"""
+        res = self._compare(f'{RECIPES_URL}?page_size=2')
+
+        self._compare(json.loads(res.content)['next'])
+
+    def test_list_filters(self):
+        """Test the filters are applied before the database builds JSON"""
+        tag = self.recipe.tags.first()
+
+        self._compare(f'{RECIPES_URL}?tags={tag.id}')
+
+    def test_detail_same_as_serializer(self):
+        """Test the detail built by the database matches the serializer"""
+        self._compare(detail_url(self.recipe.id))
+
+    @override_settings(RECIPE_SQL_JSON=True)
+    def test_detail_of_other_user(self):
+        """Test the recipes of other users are not found"""
+        other = get_user_model().objects.create_user(
+            'other@rainwalk.io',
+            'testpass'
+        )
+        self.client.force_authenticate(other)
+
+        res = self.client.get(detail_url(self.recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_recipe_list_empty(self):
+        """Test an empty page does not query the database"""
+        with self.assertNumQueries(0):
+            self.assertEqual(sql_json.recipe_list([]), b'[]')
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Needs PostgreSQL')
+class PostgresSqlJsonTests(SqlJsonTests):
+    """The tests of the database JSON, with the PostgreSQL templates"""
+
+    def test_recipe_list_same_as_serializer(self):
+        """Test json_agg gives the list serializer output, newest first"""
+        recipes = Recipe.objects.filter(user=self.user).order_by('-id')
+
+        content = sql_json.recipe_list([recipe.id for recipe in recipes])
+
+        self.assertEqual(
+            json.loads(content),
+            json.loads(json.dumps(
+                serializers.RecipeSerializer(recipes, many=True).data
+            ))
+        )
+
+    def test_recipe_detail_same_as_serializer(self):
+        """Test json_build_object gives the detail serializer output"""
+        content = sql_json.recipe_detail(self.recipe.id, self.user.id)
+
+        data = json.loads(content)
+        self.assertEqual(
+            data,
+            json.loads(json.dumps(
+                serializers.RecipeDetailSerializer(self.recipe).data
+            ))
+        )
+        # A string with both decimals, like the DecimalField
+        self.assertEqual(data['price'], '7.50')
@@ -6,11 +6,13 @@ from rest_framework import status
 from rest_framework.test import APIClient
 
 from core.models import Tag, Recipe
+from core.tests.utils import EmptyCacheMixin
 
 from recipe.serializers import TagSerializer
 
 
 TAG_URL = reverse('recipe:tag-list')
+TAG_BULK_URL = reverse('recipe:tag-bulk-upsert')
 
 
 class PublicTagsApiTests(TestCase):
@@ -26,10 +28,11 @@ class PublicTagsApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateTagsApiTests(TestCase):
+class PrivateTagsApiTests(EmptyCacheMixin, TestCase):
     """Test the authorized user tags API"""
 
     def setUp(self):
+        super().setUp()
         self.user = get_user_model().objects.create_user(
             'test@rainwalk.io',
             'password123'
@@ -142,3 +145,83 @@ class PrivateTagsApiTests(TestCase):
         res = self.client.get(TAG_URL, {'assigned_only': 1})
 
         self.assertEqual(len(res.data), 1)
+
+    def test_create_tag_duplicate_name(self):
+        """Test creating a tag with a name the user already has fails"""
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.post(TAG_URL, {'name': 'Vegan'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+
+    def test_bulk_upsert_tags(self):
+        """Test getting the ids of many tags, creating the missing ones"""
+        existing = Tag.objects.create(user=self.user, name='Vegan')
+        user2 = get_user_model().objects.create_user(
+            'other@rainwalk.io',
+            'testpass'
+        )
+        Tag.objects.create(user=user2, name='Dessert')
+
+        res = self.client.post(
+            TAG_BULK_URL,
+            {'names': ['Vegan', 'Dessert', 'Vegan', 'Quick']},
+            format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [tag['name'] for tag in res.data],
+            ['Vegan', 'Dessert', 'Quick']
+        )
+        self.assertEqual(res.data[0]['id'], existing.id)
+        tags = Tag.objects.filter(user=self.user)
+        self.assertEqual(tags.count(), 3)
+        for tag in res.data:
+            self.assertEqual(tags.get(name=tag['name']).id, tag['id'])
+
+    def test_bulk_upsert_tags_invalid(self):
+        """Test an empty list of names is rejected"""
+        res = self.client.post(TAG_BULK_URL, {'names': []}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_tags_list_cached(self):
+        """Test the list is cached until the tags of the user change"""
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.get(TAG_URL)
+        self.assertEqual(res['X-Cache'], 'MISS')
+        res = self.client.get(TAG_URL)
+        self.assertEqual(res['X-Cache'], 'HIT')
+        self.assertEqual(res.data[0]['name'], 'Vegan')
+
+        Tag.objects.create(user=self.user, name='Dessert')
+
+        res = self.client.get(TAG_URL)
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(len(res.data), 2)
+
+    def test_assigned_tags_cache_follows_recipes(self):
+        """Test assigned_only is cached apart and follows the recipe tags"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = Recipe.objects.create(
+            title='Coriander eggs on toast',
+            time_minutes=10,
+            price=5.00,
+            user=self.user
+        )
+        url = f'{TAG_URL}?assigned_only=1'
+
+        self.assertEqual(self.client.get(url).data, [])
+        self.assertEqual(len(self.client.get(TAG_URL).data), 1)
+
+        # Saving the recipe does not change which tags are used
+        recipe.save()
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+        recipe.tags.add(tag)
+        res = self.client.get(url)
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data[0]['name'], 'Vegan')
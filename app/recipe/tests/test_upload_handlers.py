@@ -0,0 +1,131 @@
+import io
+import tempfile
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+
+from recipe.upload_handlers import ImageProbe, InvalidImage
+
+
+def image_bytes(size=(10, 10), image_format='JPEG'):
+    """Return the bytes of an image"""
+    buffer = io.BytesIO()
+    Image.new('RGB', size).save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+class ImageProbeTests(TestCase):
+
+    def test_probe_reads_header(self):
+        """Test the format and dimensions come from the first bytes"""
+        data = image_bytes((300, 200), 'PNG')
+        probe = ImageProbe()
+
+        probe.feed(data[:100])
+
+        self.assertEqual(probe.format, 'PNG')
+        self.assertEqual(probe.size, (300, 200))
+
+    def test_probe_waits_for_header(self):
+        """Test a header split over chunks is parsed once complete"""
+        data = image_bytes()
+        probe = ImageProbe()
+
+        for i in range(0, len(data), 10):
+            probe.feed(data[i:i + 10])
+
+        self.assertEqual(probe.format, 'JPEG')
+
+    def test_probe_refuses_non_images(self):
+        """Test bytes that are no image are refused"""
+        probe = ImageProbe()
+        probe.feed(b'not an image')
+
+        with self.assertRaises(InvalidImage):
+            probe.finish()
+
+    def test_probe_refuses_unsupported_format(self):
+        """Test the formats missing from the settings are refused"""
+        with self.settings(IMAGE_UPLOAD_FORMATS={'JPEG': 1024 * 1024}):
+            with self.assertRaises(InvalidImage):
+                ImageProbe().feed(image_bytes(image_format='PNG'))
+
+    @override_settings(IMAGE_UPLOAD_MAX_DIMENSION=100)
+    def test_probe_refuses_large_dimensions(self):
+        """Test the dimensions are checked before decoding"""
+        with self.assertRaises(InvalidImage):
+            ImageProbe().feed(image_bytes((101, 10), 'PNG'))
+
+    @override_settings(IMAGE_UPLOAD_MAX_PIXELS=1000)
+    def test_probe_refuses_too_many_pixels(self):
+        """Test images that would decompress to a huge bitmap are refused"""
+        with self.assertRaises(InvalidImage):
+            ImageProbe().feed(image_bytes((40, 40), 'PNG'))
+
+    def test_probe_refuses_files_over_format_limit(self):
+        """Test the size limit depends on the format"""
+        data = image_bytes()
+        probe = ImageProbe()
+
+        with self.settings(IMAGE_UPLOAD_FORMATS={'JPEG': len(data) - 1}):
+            with self.assertRaises(InvalidImage):
+                probe.feed(data)
+
+
+class ImageProbeUploadHandlerTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@rainwalk.io',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=10,
+            price=5.00
+        )
+        self.url = reverse('recipe:recipe-upload-image', args=[self.recipe.id])
+
+    def _upload(self, data, suffix='.jpg'):
+        with tempfile.NamedTemporaryFile(suffix=suffix) as ntf:
+            ntf.write(data)
+            ntf.seek(0)
+            return self.client.post(
+                self.url, {'image': ntf}, format='multipart'
+            )
+
+    def test_upload_non_image_refused_early(self):
+        """Test a file that is not an image is refused by the handler"""
+        res = self._upload(b'not an image' * 100000)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data['image'], ['Upload a valid image.'])
+
+    @override_settings(IMAGE_UPLOAD_MAX_DIMENSION=100)
+    def test_upload_large_dimensions_refused(self):
+        """Test an image too large is refused from its header"""
+        res = self._upload(image_bytes((200, 10)))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('100 pixels', res.data['image'][0])
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    @override_settings(IMAGE_UPLOAD_FORMATS={'JPEG': 1000})
+    def test_upload_body_over_every_limit(self):
+        """Test a body larger than any accepted image is not read"""
+        res = self._upload(b'x' * 100 * 1024)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('non_field_errors', res.data)
@@ -0,0 +1,209 @@
+import datetime
+import io
+import os
+from io import StringIO
+from unittest.mock import patch
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import ImageUploadSession, Recipe
+from core.tests.utils import TempMediaMixin
+
+
+def sessions_url(recipe_id):
+    """Return the URL to start a chunked upload"""
+    return reverse('recipe:recipe-create-upload-session', args=[recipe_id])
+
+
+def session_url(session):
+    """Return the URL of an upload session"""
+    return reverse(
+        'recipe:recipe-upload-session',
+        args=[session.recipe_id, session.id]
+    )
+
+
+def complete_url(session):
+    """Return the URL to finish an upload session"""
+    return reverse(
+        'recipe:recipe-complete-upload-session',
+        args=[session.recipe_id, session.id]
+    )
+
+
+def sample_image():
+    """Return the bytes of a small JPEG image"""
+    buffer = io.BytesIO()
+    Image.new('RGB', (10, 10)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+@override_settings(IMAGE_UPLOAD_MAX_SIZE=1024 * 1024)
+class ImageUploadSessionTests(TempMediaMixin, TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@rainwalk.io',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=10,
+            price=5.00
+        )
+        self.data = sample_image()
+
+    def _start(self):
+        res = self.client.post(
+            sessions_url(self.recipe.id),
+            {'filename': 'photo.jpg', 'size': len(self.data)}
+        )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return ImageUploadSession.objects.get(pk=res.data['id'])
+
+    def _put(self, session, offset, chunk):
+        return self.client.put(
+            session_url(session),
+            chunk,
+            content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset)
+        )
+
+    def test_chunked_upload(self):
+        """Test an image sent in chunks is attached to the recipe"""
+        session = self._start()
+        half = len(self.data) // 2
+
+        res = self._put(session, 0, self.data[:half])
+        self.assertEqual(res.data['offset'], half)
+        res = self._put(session, half, self.data[half:])
+        self.assertEqual(res.data['offset'], len(self.data))
+        res = self.client.post(complete_url(session))
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['image_status'], Recipe.IMAGE_PENDING)
+        with self.recipe.image.open('rb') as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertFalse(ImageUploadSession.objects.exists())
+        self.assertFalse(default_storage.exists(session.temp_name))
+
+    def test_complete_checks_file_in_place(self):
+        """Test the received file is not read into memory to be checked"""
+        session = self._start()
+        self._put(session, 0, self.data)
+
+        with patch('django.forms.fields.BytesIO') as buffer:
+            res = self.client.post(complete_url(session))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        buffer.assert_not_called()
+
+    def test_resume_after_lost_chunk(self):
+        """Test a chunk at the wrong offset is refused with the offset"""
+        session = self._start()
+        self._put(session, 0, self.data[:10])
+
+        res = self._put(session, 20, self.data[20:])
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res.data['offset'], 10)
+
+        # A chunk sent again replaces the data received for it
+        res = self._put(session, 0, self.data)
+        self.assertEqual(res.data['offset'], len(self.data))
+        self.assertEqual(self.client.get(session_url(session)).data['offset'],
+                         len(self.data))
+
+    def test_complete_before_all_chunks(self):
+        """Test an upload missing chunks cannot be completed"""
+        session = self._start()
+        self._put(session, 0, self.data[:10])
+
+        res = self.client.post(complete_url(session))
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    def test_chunk_past_the_size(self):
+        """Test a chunk longer than the announced size is refused"""
+        session = self._start()
+
+        res = self._put(session, 0, self.data + b'extra')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_size_over_the_limit(self):
+        """Test a session cannot announce a file over the limit"""
+        res = self.client.post(
+            sessions_url(self.recipe.id),
+            {'filename': 'photo.jpg', 'size': 1024 * 1024 + 1}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_chunk_invalid_image(self):
+        """Test an upload that is not an image stops at the first chunk"""
+        session = self._start()
+
+        res = self._put(session, 0, b'x' * len(self.data))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', res.data)
+        self.assertFalse(ImageUploadSession.objects.exists())
+
+    def test_chunk_format_size_limit(self):
+        """Test the announced size is checked against its format limit"""
+        res = self.client.post(
+            sessions_url(self.recipe.id),
+            {'filename': 'photo.jpg', 'size': 1000}
+        )
+        session = ImageUploadSession.objects.get(pk=res.data['id'])
+
+        with self.settings(IMAGE_UPLOAD_FORMATS={'JPEG': 999}):
+            res = self._put(session, 0, self.data)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_other_user_session(self):
+        """Test the sessions of recipes of other users are not found"""
+        session = self._start()
+        other = get_user_model().objects.create_user(
+            'other@rainwalk.io',
+            'testpass'
+        )
+        self.client.force_authenticate(other)
+
+        res = self._put(session, 0, self.data)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_expire_upload_sessions(self):
+        """Test idle sessions expire with their temp files"""
+        session = self._start()
+        ImageUploadSession.objects.filter(pk=session.pk).update(
+            updated_at=timezone.now() - datetime.timedelta(days=2)
+        )
+
+        res = self._put(session, 0, self.data)
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+        call_command('expire_upload_sessions', stdout=StringIO())
+
+        self.assertFalse(ImageUploadSession.objects.exists())
+        self.assertFalse(
+            os.path.exists(default_storage.path(session.temp_name))
+        )
@@ -0,0 +1,151 @@
+from PIL import Image, ImageFile
+
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.http import QueryDict
+from django.utils.datastructures import MultiValueDict
+
+
+# Give up when the format and the dimensions are not known after this
+# many bytes (JPEG headers can hold a large EXIF block)
+PROBE_MAX_BYTES = 256 * 1024
+
+
+class InvalidImage(Exception):
+    """The upload is not an image we accept"""
+
+
+class ImageProbe:
+    """Find the format and dimensions of an image from its first bytes
+
+    Only the header is parsed, the pixels are never decoded.
+    """
+
+    def __init__(self):
+        self.parser = ImageFile.Parser()
+        self.received = 0
+        self.format = None
+        self.size = None
+
+    @property
+    def done(self):
+        return self.format is not None
+
+    def feed(self, data):
+        """Parse more of the file until the header is known"""
+        self.received += len(data)
+        if self.done:
+            self.check_length(self.received)
+            return
+
+        try:
+            self.parser.feed(data)
+        except Image.DecompressionBombError:
+            raise InvalidImage('Image has too many pixels.')
+        except Exception:
+            raise InvalidImage('Upload a valid image.')
+
+        image = self.parser.image
+        if image is None:
+            if self.received >= PROBE_MAX_BYTES:
+                raise InvalidImage('Upload a valid image.')
+            return
+
+        self.format = image.format
+        self.size = image.size
+        self.check()
+
+    def check(self):
+        """Refuse the formats and dimensions we do not accept"""
+        limits = settings.IMAGE_UPLOAD_FORMATS
+        if self.format not in limits:
+            raise InvalidImage(
+                f'{self.format} images are not supported, upload one of '
+                f'{", ".join(sorted(limits))}.'
+            )
+
+        width, height = self.size
+        if max(width, height) > settings.IMAGE_UPLOAD_MAX_DIMENSION:
+            raise InvalidImage(
+                'Ensure the image is at most '
+                f'{settings.IMAGE_UPLOAD_MAX_DIMENSION} pixels wide and high.'
+            )
+        if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+            raise InvalidImage('Image has too many pixels.')
+
+        self.check_length(self.received)
+
+    def check_length(self, length):
+        """Refuse files over the size limit of their format"""
+        if self.done and length > settings.IMAGE_UPLOAD_FORMATS[self.format]:
+            raise InvalidImage(
+                f'Ensure the {self.format} image is at most '
+                f'{settings.IMAGE_UPLOAD_FORMATS[self.format]} bytes.'
+            )
+
+    def finish(self):
+        """Refuse a file that ended before its header"""
+        if not self.done:
+            raise InvalidImage('Upload a valid image.')
+
+
+def probe_file(f, length):
+    """Check the first bytes of an image file, then its length"""
+    probe = ImageProbe()
+    while not probe.done:
+        data = f.read(16 * 1024)
+        if not data:
+            break
+        probe.feed(data)
+    probe.finish()
+    probe.check_length(length)
+    f.seek(0)
+
+    return probe
+
+
+class ImageProbeUploadHandler(FileUploadHandler):
+    """Check uploaded images while the body is being received
+
+    Put in front of the default handlers, it passes every chunk through
+    and stops reading the request as soon as the header of an image shows
+    it would be refused, instead of after the whole body was spooled and
+    decoded. The reasons end up in request.image_upload_errors.
+    """
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        self.request.image_upload_errors = {}
+        # Larger than any image we accept, whatever its format
+        limit = max(settings.IMAGE_UPLOAD_FORMATS.values())
+        if content_length and content_length > limit + 64 * 1024:
+            self.request.image_upload_errors[None] = \
+                f'Ensure the image is at most {limit} bytes.'
+            # Handled, without reading any of the body
+            return QueryDict(), MultiValueDict()
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.probe = ImageProbe()
+
+    def receive_data_chunk(self, raw_data, start):
+        try:
+            self.probe.feed(raw_data)
+        except InvalidImage as e:
+            self._reject(e)
+
+        return raw_data
+
+    def file_complete(self, file_size):
+        try:
+            self.probe.finish()
+        except InvalidImage as e:
+            self._reject(e)
+
+        # The next handler returns the file
+        return None
+
+    def _reject(self, error):
+        self.request.image_upload_errors[self.field_name] = str(error)
+        # Do not read the rest of the body
+        raise StopUpload(connection_reset=True)
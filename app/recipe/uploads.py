@@ -0,0 +1,124 @@
+import datetime
+import fcntl
+import os
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.utils import timezone
+
+from core.models import ImageUploadSession, Recipe
+
+from recipe.upload_handlers import ImageProbe, PROBE_MAX_BYTES
+
+
+# Read the body of a chunk in pieces of this size, never all of it
+CHUNK_READ_SIZE = 64 * 1024
+
+
+class ChunkConflict(Exception):
+    """The chunk does not start where the received data ends"""
+
+
+class SessionFile(UploadedFile):
+    """The received file of a session, read where it is on the disk
+
+    Like a TemporaryUploadedFile it has a path, so the image field checks
+    the file in place instead of copying all of it into memory.
+    """
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def _storage():
+    return Recipe._meta.get_field('image').storage
+
+
+def active_sessions():
+    """Return the upload sessions that did not expire"""
+    return ImageUploadSession.objects.filter(updated_at__gte=expiry_cutoff())
+
+
+def expiry_cutoff():
+    """Return the time before which an idle session is expired"""
+    return timezone.now() - datetime.timedelta(
+        seconds=settings.IMAGE_UPLOAD_SESSION_TTL
+    )
+
+
+def create_session(recipe, filename, size):
+    """Start an upload session with an empty file for the chunks"""
+    session = ImageUploadSession.objects.create(
+        recipe=recipe,
+        filename=filename,
+        size=size
+    )
+    path = _storage().path(session.temp_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+
+    return session
+
+
+def append_chunk(session, stream, offset, length):
+    """Write length bytes of the stream at offset, return the new offset
+
+    The chunk is copied in small pieces, so the memory used does not
+    depend on its size.
+    """
+    with open(_storage().path(session.temp_name), 'r+b') as f:
+        try:
+            # Only one request writes to the session at a time
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise ChunkConflict('Another chunk is being written.')
+
+        # Another request may have moved the offset since it was loaded. A
+        # chunk can start before it, when the answer to the last one was
+        # lost, but not after it or there would be a hole in the file
+        session.refresh_from_db(fields=['offset'])
+        if offset > session.offset:
+            raise ChunkConflict(
+                f'The upload continues at offset {session.offset}.'
+            )
+
+        f.seek(offset)
+        remaining = length
+        while remaining > 0:
+            data = stream.read(min(CHUNK_READ_SIZE, remaining))
+            if not data:
+                # The connection dropped, keep what was received
+                break
+            f.write(data)
+            remaining -= len(data)
+        f.truncate()
+        f.flush()
+
+        session.offset = offset + length - remaining
+        session.save(update_fields=['offset', 'updated_at'])
+
+    return session.offset
+
+
+def check_head(session):
+    """Refuse the upload as soon as its first bytes show a bad image
+
+    Raises InvalidImage, does nothing while the header is incomplete.
+    """
+    probe = ImageProbe()
+    with open(_storage().path(session.temp_name), 'rb') as f:
+        head = f.read(min(session.offset, PROBE_MAX_BYTES))
+    probe.feed(head)
+    if probe.done or session.offset == session.size:
+        probe.finish()
+        # The announced size is known, no need to wait for the last chunk
+        probe.check_length(session.size)
+
+
+def uploaded_file(session):
+    """Return the received file of a complete session, opened for reading"""
+    return SessionFile(
+        file=open(_storage().path(session.temp_name), 'rb'),
+        name=session.filename,
+        size=session.size
+    )
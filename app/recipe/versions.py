@@ -0,0 +1,79 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+# The kinds of data a version is kept for, per user
+RECIPES = 'recipes'
+TAGS = 'tags'
+INGREDIENTS = 'ingredients'
+# Which tags and ingredients are used by the recipes
+RECIPE_TAGS = 'recipe-tags'
+RECIPE_INGREDIENTS = 'recipe-ingredients'
+
+
+def _cache():
+    return caches[settings.API_VERSION_CACHE]
+
+
+def user_key(user_id, kind):
+    """Return the cache key of the version of a user's collection"""
+    return f'version:{kind}:{user_id}'
+
+
+def recipe_key(recipe_id):
+    """Return the cache key of the version of one recipe"""
+    return f'version:recipe:{recipe_id}'
+
+
+def get_versions(keys):
+    """Return the current version of every key
+
+    Versions are random tokens rather than counters, so a version that was
+    evicted or expired comes back as a new token and can never match an
+    old ETag. They expire, so the keys of ids that were only ever read
+    (or do not exist) do not pile up in the cache.
+    """
+    cache = _cache()
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            # Another request may be setting it at the same time
+            cache.add(key, uuid.uuid4().hex,
+                      timeout=settings.API_VERSION_TIMEOUT)
+        versions.update(cache.get_many(missing))
+
+    return [versions.get(key, '') for key in keys]
+
+
+def bump(keys):
+    """Give the keys a new version, now and once the transaction commits"""
+    def set_new_versions():
+        _cache().set_many(
+            {key: uuid.uuid4().hex for key in keys},
+            timeout=settings.API_VERSION_TIMEOUT
+        )
+
+    # Bumping now stops clients from getting 304 for the old data, bumping
+    # again on commit stops them from keeping a version read before the
+    # new data was visible
+    set_new_versions()
+    transaction.on_commit(set_new_versions)
+
+
+def bump_user(user_id, *kinds):
+    """Give some collections of a user a new version"""
+    bump([user_key(user_id, kind) for kind in kinds])
+
+
+def etag(request, keys):
+    """Return the ETag of a response built from the data of the keys"""
+    parts = [str(request.user.pk), request.accepted_renderer.format]
+    parts.extend(get_versions(keys))
+    digest = hashlib.md5(':'.join(parts).encode()).hexdigest()
+
+    return f'"{digest}"'
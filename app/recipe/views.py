@@ -1,46 +1,236 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from django.http import Http404, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, \
+                              patch_cache_control, patch_vary_headers
+
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import viewsets, mixins, status
-from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import ValidationError, NotFound
+from rest_framework.negotiation import BaseContentNegotiation
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.settings import api_settings
+
+from core.media import serve_file
+from core.models import Tag, Ingredient, Recipe, ImageUploadSession
+
+from user.authentication import CachedTokenAuthentication, \
+                                SignedTokenAuthentication
+
+from recipe import serializers, filters, bulk, images, uploads, versions, \
+                   metrics, fast_serializers, sql_json, exports
+from recipe.image_cache import image_cache, FORMATS
+from recipe.pagination import RecipeCursorPagination
+from recipe.upload_handlers import ImageProbeUploadHandler, InvalidImage, \
+                                   PROBE_MAX_BYTES, probe_file
+
+
+class IgnoreClientContentNegotiation(BaseContentNegotiation):
+    """Always answer errors with the first renderer"""
+    # Used by views that return files, where the Accept header asks for
+    # an image type that none of the renderers produce
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix):
+        return (renderers[0], renderers[0].media_type)
+
+
+class RenderedResponse(Response):
+    """Response with a body rendered before, for example from a cache"""
+
+    def __init__(self, content, data=None, **kwargs):
+        super().__init__(data, **kwargs)
+        self.content_before = content
+
+    @property
+    def data(self):
+        if self._data is None and self.content_before is not None:
+            # Only decoded when something in this process reads it
+            self._data = json.loads(self.content_before)
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+
+    @property
+    def rendered_content(self):
+        self['Content-Type'] = self.accepted_media_type
+        return self.content_before
+
 
-from core.models import Tag, Ingredient, Recipe
+class FastListMixin:
+    """List with plain dicts from values() rows instead of model objects"""
 
-from recipe import serializers
+    def fast_list(self, request, *args, **kwargs):
+        """Same output as the list of the serializer class, only faster"""
+        fast = fast_serializers.FastListSerializer(self.get_serializer_class())
+        queryset = fast.values(self.filter_queryset(self.get_queryset()))
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(fast.to_representation(page))
+
+        return Response(fast.to_representation(queryset))
+
+
+class ConditionalGetMixin:
+    """Answer GET requests with 304 when the client has the current data
+
+    The ETag comes from versions kept in the cache, so a matching
+    If-None-Match is answered without querying the data or serializing it.
+    """
+
+    def conditional_response(self, request, keys, handler, *args, **kwargs):
+        """Return 304 for a matching ETag, or the response of the handler"""
+        etag = versions.etag(request, keys)
+        # Also a cache key for the handler, it changes with the data
+        self.etag = etag
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+
+        response['ETag'] = etag
+        # Clients and shared caches have to check the version every time
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Accept', 'Authorization'))
+        return response
+
+    def get_version_keys(self):
+        """Return the cache keys of the versions the list depends on"""
+        raise NotImplementedError
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request,
+            self.get_version_keys(),
+            super().list,
+            *args,
+            **kwargs
+        )
 
 
 # The goal of this class is to make the code less and more easy
 # If the class have shared attributes, it will make is easier
-class BaseRecipeAttrViewSet(viewsets.GenericViewSet,
+class BaseRecipeAttrViewSet(FastListMixin,
+                            ConditionalGetMixin,
+                            viewsets.GenericViewSet,
                             mixins.ListModelMixin,
                             mixins.CreateModelMixin):
     """Base viewset for user owned recipe attributes"""
     # Pre-define class variables in the viewsets class
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (
+        CachedTokenAuthentication,
+        SignedTokenAuthentication,
+    )
     permission_classes = (IsAuthenticated,)
 
-    def get_queryset(self):
-        """Return objects for the current authenticateduser only"""
-        assigned_only = bool(
+    def assigned_only(self):
+        """Return if only the objects used by recipes are listed"""
+        return bool(
             # Convert parm to int and bool because query dont know types
             # If there is no value, assigned it to 0
             int(self.request.query_params.get('assigned_only', 0))
         )
+
+    def get_queryset(self):
+        """Return objects for the current authenticateduser only"""
         queryset = self.queryset
         # If the assigned_only is true, we apply filter that makes the recipe
         # To be equal to false and return only assigned recipes
-        if assigned_only:
+        if self.assigned_only():
             queryset = queryset.filter(recipe__isnull=False)
 
         return queryset.filter(
             user=self.request.user
         ).order_by('-name').distinct()
 
+    def get_version_keys(self):
+        keys = [versions.user_key(self.request.user.pk, self.version_kind)]
+        if self.assigned_only():
+            # Also changes when the objects are added to or removed from
+            # the recipes, but not for any other change of a recipe
+            keys.append(versions.user_key(
+                self.request.user.pk, self.version_relation
+            ))
+
+        return keys
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request,
+            self.get_version_keys(),
+            self.cached_list,
+            *args,
+            **kwargs
+        )
+
+    def cached_list(self, request, *args, **kwargs):
+        """Return the list from the cache, or query and cache it"""
+        cache = caches[settings.API_RESPONSE_CACHE]
+        # The ETag is different for every user, format and version, so a
+        # write never has to find and delete the old entries, they are
+        # just not read any more and expire
+        key = f'response:{self.version_kind}:{self.etag}:' \
+            f'{int(self.assigned_only())}'
+        data = cache.get(key)
+        metrics.record(self.metrics_name, hit=data is not None)
+        if data is not None:
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        response = self.fast_list(request)
+        # Only the serialized list, rendering it again is cheap
+        cache.set(key, list(response.data),
+                  settings.API_RESPONSE_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
+
     def perform_create(self, serializer):
         """Create a new object"""
         # Can be a new Tag or a new Ingredient
         # Save to serializer with the user as the authenticated user
-        serializer.save(user=self.request.user)
+        try:
+            with transaction.atomic():
+                serializer.save(user=self.request.user)
+        except IntegrityError:
+            # The user already has an object with this name
+            raise ValidationError({'name': 'This name already exists.'})
+
+    # Get the ids of many names at once, creating the missing ones
+    @action(methods=['POST'], detail=False, url_path='bulk')
+    def bulk_upsert(self, request):
+        """Return the ids of the names, creating the ones that are new"""
+        serializer = serializers.NameListSerializer(data=request.data)
+
+        if serializer.is_valid():
+            ids = bulk.get_or_create_by_name(
+                self.queryset.model,
+                request.user,
+                serializer.validated_data['names']
+            )
+            # The rows are inserted without the save signals
+            versions.bump_user(request.user.pk, self.version_kind)
+            return Response(
+                [{'id': pk, 'name': name} for name, pk in ids.items()],
+                status=status.HTTP_200_OK
+            )
+
+        return Response(
+            serializer.errors,
+            status=status.HTTP_400_BAD_REQUEST
+        )
 
 
 # Mixin allowed us to costumise the viewset so we could choose whatever we want
@@ -49,6 +239,9 @@ class TagViewSet(BaseRecipeAttrViewSet):
     # Pre-define class variables in the viewsets class
     queryset = Tag.objects.all()
     serializer_class = serializers.TagSerializer
+    version_kind = versions.TAGS
+    version_relation = versions.RECIPE_TAGS
+    metrics_name = 'tag-list'
 
 
 class IngredientViewSet(BaseRecipeAttrViewSet):
@@ -56,14 +249,28 @@ class IngredientViewSet(BaseRecipeAttrViewSet):
     # Pre-define class variables in the viewsets class
     queryset = Ingredient.objects.all()
     serializer_class = serializers.IngredientSerializer
+    version_kind = versions.INGREDIENTS
+    version_relation = versions.RECIPE_INGREDIENTS
+    metrics_name = 'ingredient-list'
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(FastListMixin,
+                    ConditionalGetMixin,
+                    viewsets.ModelViewSet):
     """Manage recipes in the database"""
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (
+        CachedTokenAuthentication,
+        SignedTokenAuthentication,
+    )
     permission_classes = (IsAuthenticated,)
     serializer_class = serializers.RecipeSerializer
     queryset = Recipe.objects.all()
+    pagination_class = RecipeCursorPagination
+    # Only numeric ids reach the views, any other value is a 404 from the
+    # router (the id is also part of a cache key)
+    lookup_value_regex = r'\d+'
+    # The recipe columns used by the detail serializer
+    LIST_FIELDS = ('id', 'user_id', 'title', 'time_minutes', 'price', 'link')
 
     # A function that intented to be private
     def _params_to_ints(self, qs):
@@ -78,27 +285,158 @@ class RecipeViewSet(viewsets.ModelViewSet):
         tags = self.request.query_params.get('tags')
         # check if ingredients has been provided
         ingredients = self.request.query_params.get('ingredients')
+        # Return recipes that have any (default) or all of the given ids
+        match = self.request.query_params.get('match', filters.MATCH_ANY)
         queryset = self.queryset
 
+        if match not in filters.MATCH_CHOICES:
+            raise ValidationError(
+                {'match': f'Must be one of {", ".join(filters.MATCH_CHOICES)}'}
+            )
+
         if tags:
             tag_ids = self._params_to_ints(tags)
-            # a way to filter using atags__
-            # first the tags will return all the id and then will return->
-            # all the ids within the tags
-            queryset = queryset.filter(tags__id__in=tag_ids)
+            queryset = filters.filter_by_related(
+                queryset, 'tags', tag_ids, match
+            )
 
         if ingredients:
             ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+            queryset = filters.filter_by_related(
+                queryset, 'ingredients', ingredient_ids, match
+            )
+
+        # Remove the recipes that have any of the excluded ids (allergens)
+        for relation in ('tags', 'ingredients'):
+            excluded = self.request.query_params.get(f'exclude_{relation}')
+            if excluded:
+                queryset = filters.exclude_related(
+                    queryset, relation, self._params_to_ints(excluded)
+                )
 
-        return queryset.filter(user=self.request.user)
+        queryset = queryset.filter(user=self.request.user)
+
+        return self._apply_query_plan(queryset)
+
+    def _apply_query_plan(self, queryset):
+        """Load only what the serializer for the current action needs"""
+        # The list reads values() rows with the ids of the tags and
+        # ingredients in one query per relation (see FastListMixin)
+        if self.action == 'list':
+            return queryset
+        # The detail nests the tag and ingredient serializers (id and name)
+        elif self.action == 'retrieve':
+            return queryset.only(*self.LIST_FIELDS).prefetch_related(
+                Prefetch('tags', queryset=Tag.objects.only('id', 'name')),
+                Prefetch(
+                    'ingredients',
+                    queryset=Ingredient.objects.only('id', 'name')
+                ),
+            )
+
+        # Writes need the full object so we leave the queryset as it is
+        return queryset
+
+    def get_version_keys(self):
+        return [versions.user_key(self.request.user.pk, versions.RECIPES)]
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request,
+            self.get_version_keys(),
+            self.sql_json_list if self.use_sql_json() else self.fast_list,
+            *args,
+            **kwargs
+        )
+
+    def use_sql_json(self):
+        """Return if the database builds the JSON of the response"""
+        return (
+            settings.RECIPE_SQL_JSON and
+            sql_json.supported() and
+            self.request.accepted_renderer.format == 'json' and
+            # The database only writes compact JSON
+            'indent' not in self.request.accepted_media_type
+        )
+
+    def sql_json_list(self, request, *args, **kwargs):
+        """List the recipes with the JSON body built by the database"""
+        queryset = self.filter_queryset(self.get_queryset()).values('id')
+        page = self.paginate_queryset(queryset)
+        results = sql_json.recipe_list([row['id'] for row in page])
+
+        # The same keys as get_paginated_response, around the bytes
+        links = json.dumps(
+            {
+                'next': self.paginator.get_next_link(),
+                'previous': self.paginator.get_previous_link(),
+            },
+            separators=(',', ':'),
+            ensure_ascii=False
+        ).encode()
+        return RenderedResponse(links[:-1] + b',"results":' + results + b'}')
+
+    def retrieve(self, request, *args, **kwargs):
+        # Renaming a tag or an ingredient also bumps the recipes using it
+        keys = [versions.recipe_key(kwargs['pk'])]
+        return self.conditional_response(
+            request, keys, self.cached_retrieve, *args, **kwargs
+        )
+
+    def cached_retrieve(self, request, *args, **kwargs):
+        """Return the rendered detail from the cache, or render and cache it"""
+        if request.accepted_renderer.format != 'json':
+            # The browsable API is not worth caching
+            return super().retrieve(request, *args, **kwargs)
+
+        cache = caches[settings.API_RESPONSE_CACHE]
+        # Like the lists, keyed by the ETag so writes never delete entries
+        media_type = request.accepted_media_type.replace(' ', '')
+        key = f'response:recipe:{self.etag}:{media_type}'
+        content = cache.get(key)
+        metrics.record('recipe-detail', hit=content is not None)
+        if content is not None:
+            # No query, no serializer and no JSON encoding
+            response = RenderedResponse(content)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        if self.use_sql_json():
+            content = self.sql_json_detail(kwargs['pk'])
+            response = RenderedResponse(content)
+        else:
+            response = super().retrieve(request, *args, **kwargs)
+            content = request.accepted_renderer.render(
+                response.data,
+                request.accepted_media_type,
+                self.get_renderer_context()
+            )
+            response = RenderedResponse(content, response.data)
+        cache.set(key, content, settings.API_RESPONSE_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def sql_json_detail(self, pk):
+        """Return the JSON of the recipe detail built by the database"""
+        try:
+            content = sql_json.recipe_detail(int(pk), self.request.user.pk)
+        except ValueError:
+            content = None
+        if content is None:
+            raise NotFound()
+
+        return content
 
     def get_serializer_class(self):
         """Return appropriate serializer class"""
         if self.action == 'retrieve':
             return serializers.RecipeDetailSerializer
-        elif self.action == 'upload_image':
+        elif self.action in ('upload_image', 'complete_upload_session'):
             return serializers.RecipeImageSerializer
+        elif self.action in ('create_upload_session', 'upload_session'):
+            return serializers.ImageUploadSessionSerializer
+        elif self.action == 'bulk_create':
+            return serializers.RecipeBulkSerializer
 
         return self.serializer_class
 
@@ -106,19 +444,165 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """Create a new recipe"""
         serializer.save(user=self.request.user)
 
+    # Create many recipes at once, for importers
+    @action(methods=['POST'], detail=False, url_path='bulk')
+    def bulk_create(self, request):
+        """Create a list of recipes in one transaction"""
+        serializer = self.get_serializer(data=request.data, many=True)
+
+        if serializer.is_valid():
+            recipes = serializer.save(user=request.user)
+            # The rows may be inserted without the save signals
+            versions.bump_user(
+                request.user.pk,
+                versions.RECIPES,
+                versions.RECIPE_TAGS,
+                versions.RECIPE_INGREDIENTS
+            )
+            # Answer in the same format as the list, in two more queries
+            prefetch_related_objects(recipes, 'tags', 'ingredients')
+            return Response(
+                serializers.RecipeSerializer(recipes, many=True).data,
+                status=status.HTTP_201_CREATED
+            )
+
+        # The errors are a list with one entry per recipe of the request
+        return Response(
+            serializer.errors,
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    # Download all the recipes, for example ?fmt=csv (the filters of the
+    # list work here too)
+    @action(
+        methods=['GET'],
+        detail=False,
+        url_path='export',
+        content_negotiation_class=IgnoreClientContentNegotiation
+    )
+    def export(self, request):
+        """Stream the recipes of the user as NDJSON or CSV"""
+        fmt = request.query_params.get('fmt', 'ndjson')
+        if fmt not in exports.FORMATS:
+            raise ValidationError(
+                {'fmt': f'Must be one of {", ".join(exports.FORMATS)}'}
+            )
+        content_type, extension = exports.FORMATS[fmt]
+
+        # Written while the rows are read, never held in memory at once
+        response = StreamingHttpResponse(
+            exports.export(
+                self.filter_queryset(self.get_queryset()),
+                fmt,
+                settings.RECIPE_EXPORT_CHUNK_SIZE
+            ),
+            content_type=content_type
+        )
+        response['Content-Disposition'] = \
+            f'attachment; filename="recipes.{extension}"'
+        response['Cache-Control'] = 'private, no-store'
+        return response
+
+    # A ZIP of the recipes with their tags, ingredients and images
+    @action(
+        methods=['GET'],
+        detail=False,
+        url_path='archive',
+        content_negotiation_class=IgnoreClientContentNegotiation
+    )
+    def archive(self, request):
+        """Stream a ZIP archive of the recipes of the user with the images"""
+        # Written while the rows and files are read, never held in memory
+        response = StreamingHttpResponse(
+            exports.archive(
+                request.user,
+                self.filter_queryset(self.get_queryset()),
+                settings.RECIPE_EXPORT_CHUNK_SIZE
+            ),
+            content_type='application/zip'
+        )
+        response['Content-Disposition'] = \
+            'attachment; filename="recipes.zip"'
+        response['Cache-Control'] = 'private, no-store'
+        return response
+
+    # Resize the image of a recipe, for example ?w=320&fmt=webp
+    @action(
+        methods=['GET'],
+        detail=True,
+        url_path='image',
+        content_negotiation_class=IgnoreClientContentNegotiation
+    )
+    def resized_image(self, request, pk=None):
+        """Return the recipe image resized to the requested width"""
+        recipe = self.get_object()
+        if not recipe.image:
+            raise NotFound('This recipe has no image.')
+
+        fmt = request.query_params.get('fmt', 'jpeg')
+        if fmt not in FORMATS:
+            raise ValidationError(
+                {'fmt': f'Must be one of {", ".join(FORMATS)}'}
+            )
+        try:
+            width = int(request.query_params.get('w', 0))
+        except ValueError:
+            width = 0
+        if not 0 < width <= settings.IMAGE_RESIZE_MAX_WIDTH:
+            raise ValidationError({
+                'w': 'Must be a width between 1 and '
+                     f'{settings.IMAGE_RESIZE_MAX_WIDTH}'
+            })
+
+        # Another process may evict the file between get_path and
+        # serve_file, it is then resized once more
+        for retry in (True, False):
+            try:
+                path = image_cache.get_path(recipe.image.name, width, fmt)
+            except FileNotFoundError:
+                raise NotFound('The image file of this recipe is missing.')
+            try:
+                # The URL of a new image is different, so clients can keep it
+                return serve_file(
+                    request,
+                    image_cache.root,
+                    os.path.relpath(path, image_cache.root),
+                    settings.IMAGE_CACHE_ACCEL_PREFIX,
+                    cache_control='private, max-age=86400'
+                )
+            except Http404:
+                if not retry:
+                    raise
+
     # Upload image to recipes that already exists
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
         """Upload an image to a recipe"""
         recipe = self.get_object()
+        # Check the image while it is received, before request.data reads
+        # the whole body
+        request.upload_handlers.insert(
+            0, ImageProbeUploadHandler(request._request)
+        )
+        data = request.data
+        errors = getattr(request._request, 'image_upload_errors', None)
+        if errors:
+            return Response(
+                {
+                    field or api_settings.NON_FIELD_ERRORS_KEY: [message]
+                    for field, message in errors.items()
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
         serializer = self.get_serializer(
             recipe,
-            data=request.data
+            data=data
         )
 
         # Return if the data is vaild
         if serializer.is_valid():
-            serializer.save()
+            self._save_image(serializer)
             return Response(
                 serializer.data,
                 status=status.HTTP_200_OK
@@ -129,3 +613,120 @@ class RecipeViewSet(viewsets.ModelViewSet):
             serializer.errors,
             status=status.HTTP_400_BAD_REQUEST
         )
+
+    def _save_image(self, serializer):
+        """Save the new image of the recipe and start processing it"""
+        with transaction.atomic():
+            # The image get_object() saw may have been replaced since by a
+            # retried upload, lock the row and release the one it has now
+            old_image = Recipe.objects.select_for_update().get(
+                pk=serializer.instance.pk
+            ).image.name
+            # Answer now, the renditions are made by the worker pool
+            recipe = serializer.save(image_status=Recipe.IMAGE_PENDING)
+            images.replace_image(recipe, old_image)
+        images.process_in_background(recipe)
+
+    # Large images can be sent in chunks over slow connections: create a
+    # session, PUT the chunks with an Upload-Offset header, then complete
+    @action(methods=['POST'], detail=True, url_path='upload-sessions')
+    def create_upload_session(self, request, pk=None):
+        """Start a chunked upload of an image to a recipe"""
+        recipe = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        session = uploads.create_session(recipe, **serializer.validated_data)
+
+        return Response(
+            self.get_serializer(session).data,
+            status=status.HTTP_201_CREATED
+        )
+
+    def _get_upload_session(self, session_id):
+        """Return the session of the recipe, unless it expired"""
+        recipe = self.get_object()
+        try:
+            return uploads.active_sessions().get(
+                recipe=recipe,
+                pk=session_id
+            )
+        except ImageUploadSession.DoesNotExist:
+            raise NotFound()
+
+    @action(methods=['GET', 'PUT', 'DELETE'], detail=True,
+            url_path=r'upload-sessions/(?P<session_id>[0-9a-f-]{36})')
+    def upload_session(self, request, pk=None, session_id=None):
+        """Show, continue or cancel a chunked upload"""
+        session = self._get_upload_session(session_id)
+
+        if request.method == 'DELETE':
+            session.delete()
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        if request.method == 'GET':
+            return Response(self.get_serializer(session).data)
+
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers['Content-Length'])
+        except (KeyError, ValueError):
+            raise ValidationError(
+                'Upload-Offset and Content-Length headers are required.'
+            )
+        if offset < 0 or offset + length > session.size:
+            raise ValidationError('The chunk is outside of the file.')
+
+        try:
+            # The body is read here as a stream, never parsed or buffered
+            uploads.append_chunk(session, request.stream, offset, length)
+        except uploads.ChunkConflict as e:
+            return Response(
+                {'detail': str(e), 'offset': session.offset},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        if offset < PROBE_MAX_BYTES:
+            try:
+                # Stop a junk upload at its first chunks, not the last one
+                uploads.check_head(session)
+            except InvalidImage as e:
+                session.delete()
+                return Response(
+                    {'image': [str(e)]},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        return Response(self.get_serializer(session).data)
+
+    @action(methods=['POST'], detail=True,
+            url_path=r'upload-sessions/(?P<session_id>[0-9a-f-]{36})/complete')
+    def complete_upload_session(self, request, pk=None, session_id=None):
+        """Attach the image of a fully received upload to the recipe"""
+        session = self._get_upload_session(session_id)
+        if session.offset != session.size:
+            return Response(
+                {
+                    'detail': 'The upload is not complete.',
+                    'offset': session.offset
+                },
+                status=status.HTTP_409_CONFLICT
+            )
+
+        recipe = session.recipe
+        with uploads.uploaded_file(session) as image:
+            try:
+                probe_file(image, session.size)
+            except InvalidImage as e:
+                return Response(
+                    {'image': [str(e)]},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            serializer = self.get_serializer(recipe, data={'image': image})
+            if not serializer.is_valid():
+                return Response(
+                    serializer.errors,
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            self._save_image(serializer)
+        session.delete()
+
+        return Response(serializer.data)
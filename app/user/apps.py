@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class UserConfig(AppConfig):
     name = 'user'
+
+    def ready(self):
+        # Connect the signals that keep the token cache up to date
+        from user import signals  # noqa: F401
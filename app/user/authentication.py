@@ -0,0 +1,167 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, \
+                                          TokenAuthentication, \
+                                          get_authorization_header
+
+from user import tokens
+
+
+class TokenCache:
+    """Bounded LRU map of token keys to users where entries expire"""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        # key -> (expires at, user, token), the oldest used entry is first
+        self._entries = OrderedDict()
+        # user id -> keys, so all the tokens of a user can be dropped at once
+        self._user_keys = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the (user, token) cached for the key or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, user, token = entry
+            if expires <= time.monotonic():
+                self._remove(key)
+                return None
+            # Mark the entry as the most recently used
+            self._entries.move_to_end(key)
+
+        # Every request gets its own copy so changes made while handling
+        # one request never leak into another one
+        return copy.copy(user), token
+
+    def set(self, key, user, token):
+        """Cache the user and token for the key"""
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, user, token)
+            self._user_keys.setdefault(user.pk, set()).add(key)
+            # Evict the least recently used entries to stay bounded
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, key):
+        """Remove the key from the cache"""
+        with self._lock:
+            self._remove(key)
+
+    def delete_user(self, user_id):
+        """Remove every key that belongs to the user"""
+        with self._lock:
+            for key in list(self._user_keys.get(user_id, ())):
+                self._remove(key)
+
+    def clear(self):
+        """Remove every entry"""
+        with self._lock:
+            self._entries.clear()
+            self._user_keys.clear()
+
+    def _remove(self, key):
+        """Remove the key, the lock must be held"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        user_id = entry[1].pk
+        keys = self._user_keys.get(user_id)
+        keys.discard(key)
+        if not keys:
+            del self._user_keys[user_id]
+
+
+# One cache per worker process, shared by all its threads
+token_cache = TokenCache(
+    max_size=getattr(settings, 'TOKEN_CACHE_MAX_SIZE', 10000),
+    ttl=getattr(settings, 'TOKEN_CACHE_TTL', 60),
+)
+# The users of signed access tokens, keyed by the user id
+user_cache = TokenCache(
+    max_size=getattr(settings, 'TOKEN_CACHE_MAX_SIZE', 10000),
+    ttl=getattr(settings, 'TOKEN_CACHE_TTL', 60),
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication that remembers the token owner in memory"""
+
+    def authenticate_credentials(self, key):
+        """Return the user of the token, hitting the database on a miss"""
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached
+
+        # Validate the token and the user exactly like DRF does
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user, token)
+
+        return user, token
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """Authenticate signed access tokens, checking them in memory
+
+    The signature and the expiry are checked without the database. The
+    user is still read from it (to get the user object and check that it
+    is active) on the first request of every TOKEN_CACHE_TTL seconds in
+    each worker process, then kept in memory like CachedTokenAuthentication
+    does. A deactivated user is refused within that time.
+
+    Clients should authenticate by passing the access token in the
+    "Authorization" HTTP header, for example:
+
+        Authorization: Bearer <access token>
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            msg = _('Invalid token header.')
+            raise exceptions.AuthenticationFailed(msg)
+
+        try:
+            token = auth[1].decode()
+            user_id = tokens.read_access_token(token)
+        except (UnicodeError, tokens.InvalidToken):
+            msg = _('Invalid or expired token.')
+            raise exceptions.AuthenticationFailed(msg)
+
+        return self.get_user(user_id), token
+
+    def get_user(self, user_id):
+        """Return the active user, from memory when it was seen recently
+
+        On a miss this is a database query, once per TOKEN_CACHE_TTL and
+        worker process for every user.
+        """
+        cached = user_cache.get(user_id)
+        if cached is not None:
+            return cached[0]
+
+        user = get_user_model().objects.filter(pk=user_id).first()
+        if user is None or not user.is_active:
+            msg = _('User inactive or deleted.')
+            raise exceptions.AuthenticationFailed(msg)
+        user_cache.set(user_id, user, None)
+
+        return user
+
+    def authenticate_header(self, request):
+        return self.keyword
@@ -3,6 +3,8 @@ from django.utils.translation import ugettext_lazy as _
 
 from rest_framework import serializers
 
+from user import tokens
+
 
 class UserSerializer(serializers.ModelSerializer):
     """Serializer for the users objects"""
@@ -68,3 +70,18 @@ class AuthTokenSerializer(serializers.Serializer):
         # User attrs is set to be equal to the user
         attrs['user'] = user
         return attrs
+
+
+class RefreshTokenSerializer(serializers.Serializer):
+    """Serializer for exchanging a refresh token for new tokens"""
+    refresh = serializers.CharField(trim_whitespace=False)
+
+    def validate(self, attrs):
+        """Validate the refresh token and return its user"""
+        try:
+            attrs['user'] = tokens.read_refresh_token(attrs['refresh'])
+        except tokens.InvalidToken:
+            msg = _('Invalid or expired refresh token')
+            raise serializers.ValidationError(msg, code='authentication')
+
+        return attrs
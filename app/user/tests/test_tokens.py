@@ -0,0 +1,149 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from user import tokens
+from user.authentication import token_cache, user_cache
+
+
+ACCESS_URL = reverse('user:token-access')
+REFRESH_URL = reverse('user:token-refresh')
+ME_URL = reverse('user:me')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+class SignedTokenApiTests(TestCase):
+    """Test the signed access and refresh tokens"""
+
+    def setUp(self):
+        token_cache.clear()
+        user_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@rainwalk.io',
+            'testpass',
+            name='Test'
+        )
+        self.client = APIClient()
+
+    def tearDown(self):
+        token_cache.clear()
+        user_cache.clear()
+
+    def _get_tokens(self):
+        res = self.client.post(ACCESS_URL, {
+            'email': 'test@rainwalk.io',
+            'password': 'testpass',
+        })
+        return res.data
+
+    def test_create_access_token(self):
+        """Test valid credentials return an access and refresh token"""
+        res = self.client.post(ACCESS_URL, {
+            'email': 'test@rainwalk.io',
+            'password': 'testpass',
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('access', res.data)
+        self.assertIn('refresh', res.data)
+
+    def test_create_access_token_invalid_credentials(self):
+        """Test no tokens are returned for a wrong password"""
+        res = self.client.post(ACCESS_URL, {
+            'email': 'test@rainwalk.io',
+            'password': 'wrong',
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertNotIn('access', res.data)
+
+    def test_access_token_without_database(self):
+        """Test a known user's access token is verified in memory"""
+        access = self._get_tokens()['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], self.user.email)
+
+    def test_tampered_access_token_rejected(self):
+        """Test a modified access token is rejected"""
+        access = self._get_tokens()['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}x')
+
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_expired_access_token_rejected(self):
+        """Test an access token stops working after its lifetime"""
+        with patch('django.core.signing.time.time', return_value=1000):
+            access = tokens.create_access_token(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+
+        with patch('django.core.signing.time.time', return_value=100000):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_token_not_an_access_token(self):
+        """Test a refresh token can not authenticate requests"""
+        refresh = self._get_tokens()['refresh']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh}')
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_returns_new_access_token(self):
+        """Test exchanging a refresh token for a working access token"""
+        refresh = self._get_tokens()['refresh']
+
+        res = self.client.post(REFRESH_URL, {'refresh': refresh})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {res.data["access"]}'
+        )
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_refresh_revoked_by_password_change(self):
+        """Test changing the password revokes the refresh tokens"""
+        refresh = self._get_tokens()['refresh']
+
+        self.user.set_password('newpassword')
+        self.user.save()
+        res = self.client.post(REFRESH_URL, {'refresh': refresh})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_deactivated_user_access_token_rejected(self):
+        """Test deactivating the user rejects its cached access tokens"""
+        access = self._get_tokens()['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.client.get(ME_URL)
+
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_legacy_token_still_works(self):
+        """Test the database tokens keep working next to signed tokens"""
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
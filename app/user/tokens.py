@@ -0,0 +1,78 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.utils.crypto import constant_time_compare
+
+
+# Different salts so an access token can never be used as a refresh token
+ACCESS_SALT = 'user.tokens.access'
+REFRESH_SALT = 'user.tokens.refresh'
+
+
+class InvalidToken(Exception):
+    """The token is malformed, tampered with, expired or revoked"""
+
+
+def create_access_token(user):
+    """Return a short lived signed token that carries the user id"""
+    # The signature covers the payload and the time it was created, so the
+    # token can be checked without the database (the user is still looked
+    # up, see SignedTokenAuthentication)
+    return signing.dumps({'uid': user.pk}, salt=ACCESS_SALT)
+
+
+def read_access_token(token):
+    """Return the user id of a valid access token"""
+    try:
+        payload = signing.loads(
+            token,
+            salt=ACCESS_SALT,
+            max_age=settings.ACCESS_TOKEN_LIFETIME
+        )
+    except signing.BadSignature:
+        # SignatureExpired is a BadSignature as well
+        raise InvalidToken()
+
+    return payload['uid']
+
+
+def create_refresh_token(user):
+    """Return a long lived signed token that can get new access tokens"""
+    # The session hash changes with the password, so changing the password
+    # revokes every refresh token of the user
+    return signing.dumps(
+        {'uid': user.pk, 'hash': user.get_session_auth_hash()},
+        salt=REFRESH_SALT
+    )
+
+
+def read_refresh_token(token):
+    """Return the active user of a valid refresh token"""
+    try:
+        payload = signing.loads(
+            token,
+            salt=REFRESH_SALT,
+            max_age=settings.REFRESH_TOKEN_LIFETIME
+        )
+    except signing.BadSignature:
+        raise InvalidToken()
+
+    # Refreshing is rare, so this is where we check the database
+    user = get_user_model().objects.filter(
+        pk=payload['uid'], is_active=True
+    ).first()
+    if user is None or not constant_time_compare(
+        payload['hash'], user.get_session_auth_hash()
+    ):
+        raise InvalidToken()
+
+    return user
+
+
+def create_token_pair(user):
+    """Return the response body with a new access and refresh token"""
+    return {
+        'access': create_access_token(user),
+        'refresh': create_refresh_token(user),
+        'expires_in': settings.ACCESS_TOKEN_LIFETIME,
+    }
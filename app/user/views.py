@@ -1,8 +1,13 @@
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, permissions
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
 
-from user.serializers import UserSerializer, AuthTokenSerializer
+from user import tokens
+from user.authentication import CachedTokenAuthentication, \
+                                SignedTokenAuthentication
+from user.serializers import UserSerializer, AuthTokenSerializer, \
+                             RefreshTokenSerializer
 
 
 class CreateUserView(generics.CreateAPIView):
@@ -17,10 +22,33 @@ class CreateTokenView(ObtainAuthToken):
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
 
+class CreateAccessTokenView(generics.GenericAPIView):
+    """Create a signed access token and a refresh token for user"""
+    serializer_class = AuthTokenSerializer
+    # No authentication needed, the credentials are in the body
+    authentication_classes = ()
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        return Response(
+            tokens.create_token_pair(serializer.validated_data['user'])
+        )
+
+
+class RefreshAccessTokenView(CreateAccessTokenView):
+    """Exchange a refresh token for a new access and refresh token"""
+    serializer_class = RefreshTokenSerializer
+
+
 class ManageUserView(generics.RetrieveUpdateAPIView):
     """Manage the authenticated user"""
     serializer_class = UserSerializer
-    authentication_classes = (authentication.TokenAuthentication,)
+    authentication_classes = (
+        CachedTokenAuthentication,
+        SignedTokenAuthentication,
+    )
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_object(self):